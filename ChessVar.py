@@ -7,6 +7,226 @@
 #              or eight Pawns. All other standard chess rules apply. Program also features support classes for ChessVar:
 #              ChessBoard and GamePiece. GamePiece has a separate subclass for each standard chess piece.
 
+import random
+
+
+LETTERS = {'A': 1, 'B': 2, 'C': 3, 'D': 4, 'E': 5, 'F': 6, 'G': 7, 'H': 8}  # shared letter -> numeric table, 'A5' is (1, 5)
+
+WHITE, BLACK = 0, 1  # team codes, used in place of comparing 'White'/'Black' strings
+TEAM_NAMES = ('White', 'Black')
+TEAM_CODES = {'White': WHITE, 'Black': BLACK}
+GAME_STATES = ('UNFINISHED', 'WHITE_WON', 'BLACK_WON')  # game state code -> game state, for the packed formats
+
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6)  # piece type codes, used in place of comparing get_name() strings
+PIECE_NAMES = ('Pawn', 'Knight', 'Bishop', 'Rook', 'Queen', 'King')
+PIECE_CODES = {'Pawn': PAWN, 'Knight': KNIGHT, 'Bishop': BISHOP, 'Rook': ROOK, 'Queen': QUEEN, 'King': KING}
+PIECE_LETTERS = 'PNBRQK'  # piece type code -> letter used by the text format, lowercase for black
+
+
+def square_index(number, letter):
+    """
+    converts a (row number, letter numeric) pair into a bit position for the bitboards. 'A1' is bit 0, 'H1' is bit 7,
+    'A2' is bit 8 and so on up to 'H8' at bit 63
+    """
+    return (number - 1) * 8 + (letter - 1)
+
+
+def _build_between_tables():
+    """
+    builds the lookup tables used by the path checks. For every (start, end) pair of square indexes the entry at
+    start * 64 + end is a mask of the squares strictly between them, or None if the two squares don't share a
+    row/column (rook table) or a diagonal (bishop table). A square paired with itself gets an empty mask.
+    """
+    rook_between = [None] * 4096
+    bishop_between = [None] * 4096
+    for start_number in range(1, 9):
+        for start_letter in range(1, 9):
+            for end_number in range(1, 9):
+                for end_letter in range(1, 9):
+                    step_number = (end_number > start_number) - (end_number < start_number)  # -1, 0 or 1
+                    step_letter = (end_letter > start_letter) - (end_letter < start_letter)
+                    mask = 0
+                    number = start_number + step_number
+                    letter = start_letter + step_letter
+                    pair = square_index(start_number, start_letter) * 64 + square_index(end_number, end_letter)
+                    if start_number == end_number or start_letter == end_letter:
+                        table = rook_between
+                    elif abs(start_number - end_number) == abs(start_letter - end_letter):
+                        table = bishop_between
+                    else:
+                        continue  # not lined up, leave it as None
+                    while number != end_number or letter != end_letter:
+                        mask |= 1 << square_index(number, letter)
+                        number += step_number
+                        letter += step_letter
+                    table[pair] = mask
+    bishop_between[0::65] = [0] * 64  # a square is on its own diagonal too
+    return rook_between, bishop_between
+
+
+ROOK_BETWEEN, BISHOP_BETWEEN = _build_between_tables()
+
+
+SQUARE_NAMES = [letter + str(number) for number in range(1, 9) for letter in 'ABCDEFGH']  # square index -> 'A1' style name
+SQUARE_COORDS = [(number, letter) for number in range(1, 9) for letter in range(1, 9)]  # square index -> (number, letter)
+
+# every way a square can be handed to the public API -> square index. 'E2', 'e2' and 12 all map to 12, so turning
+# input into an int is one dictionary lookup and nothing past the API boundary has to parse strings again
+SQUARES = {}
+for _square, _name in enumerate(SQUARE_NAMES):
+    SQUARES[_name] = _square
+    SQUARES[_name.lower()] = _square
+    SQUARES[_square] = _square
+
+ORTHOGONAL_STEPS = ((1, 0), (-1, 0), (0, 1), (0, -1))  # (row step, letter step)
+DIAGONAL_STEPS = ((1, 1), (1, -1), (-1, 1), (-1, -1))
+KNIGHT_OFFSETS = ((2, 1), (2, -1), (-2, 1), (-2, -1), (1, 2), (1, -2), (-1, 2), (-1, -2))
+
+
+def _build_jump_table(offsets):
+    """returns a list holding, for every square index, a tuple of the squares reached by the given (row, letter) offsets"""
+    table = []
+    for number, letter in SQUARE_COORDS:
+        targets = []
+        for step_number, step_letter in offsets:
+            if 1 <= number + step_number <= 8 and 1 <= letter + step_letter <= 8:
+                targets.append(square_index(number + step_number, letter + step_letter))
+        table.append(tuple(targets))
+    return table
+
+
+def _build_ray_table(steps):
+    """
+    returns a list holding, for every square index, one tuple per direction of the squares a sliding piece passes
+    over in that direction, nearest square first and running until the edge of the board
+    """
+    table = []
+    for number, letter in SQUARE_COORDS:
+        rays = []
+        for step_number, step_letter in steps:
+            ray = []
+            next_number = number + step_number
+            next_letter = letter + step_letter
+            while 1 <= next_number <= 8 and 1 <= next_letter <= 8:
+                ray.append(square_index(next_number, next_letter))
+                next_number += step_number
+                next_letter += step_letter
+            if ray:
+                rays.append(tuple(ray))
+        table.append(tuple(rays))
+    return table
+
+
+KNIGHT_JUMPS = _build_jump_table(KNIGHT_OFFSETS)
+KING_STEPS = _build_jump_table(ORTHOGONAL_STEPS + DIAGONAL_STEPS)
+ROOK_RAYS = _build_ray_table(ORTHOGONAL_STEPS)
+BISHOP_RAYS = _build_ray_table(DIAGONAL_STEPS)
+QUEEN_RAYS = [ROOK_RAYS[square] + BISHOP_RAYS[square] for square in range(64)]
+
+
+def _build_move_paths(jumps, slides):
+    """
+    compiles a piece's movement into a list indexed by start square index * 64 + end square index: None where the
+    piece can't get from start to end in one move, otherwise the mask of squares that have to be empty on the way
+    (0 for a jump). jumps are (row step, letter step) offsets and slides the directions the piece slides along
+    """
+    paths = [None] * 4096
+    for start, (number, letter) in enumerate(SQUARE_COORDS):
+        for step_number, step_letter in slides:
+            between = 0
+            next_number = number + step_number
+            next_letter = letter + step_letter
+            while 1 <= next_number <= 8 and 1 <= next_letter <= 8:
+                end = square_index(next_number, next_letter)
+                paths[start * 64 + end] = between
+                between |= 1 << end
+                next_number += step_number
+                next_letter += step_letter
+        for step_number, step_letter in jumps:  # after the slides, so a square reached both ways needs no clear path
+            if 1 <= number + step_number <= 8 and 1 <= letter + step_letter <= 8:
+                paths[start * 64 + square_index(number + step_number, letter + step_letter)] = 0
+    return paths
+
+
+def _build_pawn_tables():
+    """
+    compiles the Pawn rules, which don't fit jumps and slides: forward only, as far as row 4 (5 for black) on the
+    first move with no path check, one row after that, and captures one letter over on any row it could move to,
+    sideways included. Returns (paths, targets): paths[take][team code][first_move] is a move table like
+    _build_move_paths() makes, and targets[team code][first_move][square index] the (end square index, take)
+    candidates in the order the legal move generators list them
+    """
+    paths = [[[[None] * 4096 for first_move in range(2)] for side in range(2)] for take in range(2)]
+    targets = [[[None] * 64 for first_move in range(2)] for side in range(2)]
+    for start, (number, letter) in enumerate(SQUARE_COORDS):
+        for side in (WHITE, BLACK):
+            for first_move in (False, True):
+                if side == WHITE:
+                    low, high = number, (4 if first_move else number + 1)
+                else:
+                    low, high = (5 if first_move else number - 1), number
+                candidates = []
+                for row in range(max(low, 1), min(high, 8) + 1):
+                    if row != number:  # straight ahead, only onto open spaces
+                        end = square_index(row, letter)
+                        paths[False][side][first_move][start * 64 + end] = 0
+                        candidates.append((end, False))
+                    for side_letter in (letter - 1, letter + 1):  # captures are one letter over, forward or sideways
+                        if 1 <= side_letter <= 8:
+                            end = square_index(row, side_letter)
+                            paths[True][side][first_move][start * 64 + end] = 0
+                            candidates.append((end, True))
+                targets[side][first_move][start] = tuple(candidates)
+    return paths, targets
+
+
+PAWN_PATHS, PAWN_TARGETS = _build_pawn_tables()
+PAWN_ATTACKS = [[[sum(1 << end for end, take in PAWN_TARGETS[side][first_move][square] if take)
+                  for square in range(64)] for first_move in range(2)]
+                for side in range(2)]  # [team code][first_move][square index] -> mask of squares a Pawn attacks
+
+CAPTURES_TO_WIN = {'King': 1, 'Queen': 1, 'Rook': 2, 'Bishop': 2, 'Knight': 2, 'Pawn': 8}  # captures of one type that win the game
+CAPTURE_LIMITS = tuple(CAPTURES_TO_WIN[name] for name in PIECE_NAMES)  # the same thing indexed by piece type code
+
+SNAPSHOT_SIZE = 39  # bytes in a ChessVar.to_bytes() snapshot
+RENDER_STYLES = ('plain', 'ansi', 'compact')  # styles accepted by ChessBoard.render_board()
+ANSI_LIGHT = '\x1b[48;5;180m'  # terminal escape codes used by the 'ansi' render style
+ANSI_DARK = '\x1b[48;5;94m'
+ANSI_WHITE_PIECE = '\x1b[1;97m'
+ANSI_BLACK_PIECE = '\x1b[1;30m'
+ANSI_RESET = '\x1b[0m'
+ANSI_FILES = '   A  B  C  D  E  F  G  H\n'  # letter row printed under the 'ansi' board
+UNMOVED_PAWN_CODES = (13, 14)  # snapshot square codes for a Pawn that still has its first move, by team code
+
+COMPACT_TURN = 64  # CompactGame layout: bytes 0-63 are the squares, then these
+COMPACT_STATE = 65
+COMPACT_COUNTS = 66  # 12 capture counts, team code * 6 + piece type code
+COMPACT_HASH = 78  # the position hash, 8 bytes little-endian
+COMPACT_SIZE = 86
+COMPACT_PIECES = ((None,) + tuple((code // 6, code % 6, False) for code in range(12))
+                  + ((WHITE, PAWN, True), (BLACK, PAWN, True)))  # square code -> (team code, type code, first_move)
+
+
+def _build_zobrist_keys():
+    """
+    builds the random 64-bit keys used for position hashing. The generator is seeded so every process (and every
+    saved hash) agrees on the same keys. Piece and capture keys are indexed by team code * 6 + piece type code, and
+    capture keys then by how many of that type a team has taken, with a count of zero hashing to 0 so a fresh game
+    only needs the piece keys.
+    """
+    generator = random.Random(20231206)
+    piece_keys = []
+    capture_keys = []
+    for side in (WHITE, BLACK):
+        for kind in range(6):
+            piece_keys.append([generator.getrandbits(64) for square in range(64)])
+            capture_keys.append([0] + [generator.getrandbits(64) for count in range(CAPTURE_LIMITS[kind])])
+    first_move_keys = [[generator.getrandbits(64) for square in range(64)] for side in (WHITE, BLACK)]
+    return piece_keys, first_move_keys, capture_keys, generator.getrandbits(64)
+
+
+ZOBRIST_PIECES, ZOBRIST_FIRST_MOVE, ZOBRIST_CAPTURES, ZOBRIST_BLACK_TO_MOVE = _build_zobrist_keys()
+
 
 # noinspection PyTypeChecker
 class ChessBoard:
@@ -15,12 +235,15 @@ class ChessBoard:
     Board is comprised of a list of lists with each item in the list either being 'None' or a unique GamePiece item
     Contains methods for checking movement paths between two points along vertical, horizontal, and diagonal axis.
     Board also has a dictionary with letters A-H as keys assigned ascending numeric values starting at 1 for use
-    in coordinate crafting.
+    in coordinate crafting. ChessBoard(populate=False) builds an empty board instead, for loading saved positions.
     """
-    def __init__(self):
+    _letters = LETTERS  # shared by every board. 'A5' to 'C5' translates to (1, 5) to (3, 5)
+
+    def __init__(self, populate=True):
         self._board = []
-        self._letters = {'A': 1, 'B': 2, 'C': 3, 'D': 4, 'E': 5, 'F': 6, 'G': 7, 'H': 8}
-        # this dictionary is for assigning numerics to letters. 'A5' to 'C5' translates to (1, 5) to (3, 5)
+        self._row_stamps = [0] * 10  # row number -> bumped every time a piece leaves or lands on that row
+        self._render_cache = {}  # render style -> (row stamps the cached rows were built at, cached rows)
+        self._changed = 0  # mask of the squares whose contents changed since the last take_changes()
 
         for num in range(8):
             self._board.append([num+1])  # this sets the '0' element of every row to the number of that row for organization’s sake
@@ -28,6 +251,13 @@ class ChessBoard:
             for fill in range(8):
                 list.append(None)       # Populate all the spaces on the 'board' with none.
 
+        if not populate:
+            self._board.insert(0, [' ', ' A ', ' B ', ' C ', ' D ', ' E ', ' F ', ' G ', ' H '])
+            self._board.append([' ', ' A ', ' B ', ' C ', ' D ', ' E ', ' F ', ' G ', ' H '])
+            self._occupied = 0
+            self._team_masks = [0, 0]
+            return
+
         self._board[0][1] = Rook('White', 'A1')  # populate the white pieces
         self._board[0][2] = Knight('White', 'B1')
         self._board[0][3] = Bishop('White', 'C1')
@@ -66,31 +296,92 @@ class ChessBoard:
 
         self._board.insert(0, [' ', ' A ', ' B ', ' C ', ' D ', ' E ', ' F ', ' G ', ' H '])  # add column markers for ease
         self._board.append([' ', ' A ', ' B ', ' C ', ' D ', ' E ', ' F ', ' G ', ' H '])
+        self._occupied = 0xFFFF00000000FFFF  # bit mask of every filled square, rows 1, 2, 7 and 8 to start
+        self._team_masks = [0xFFFF, 0xFFFF << 48]  # team code -> bit mask of that team's squares
 
     def get_board(self):
         """returns the game board in its natural Python List format"""
         return self._board
 
     def get_position(self, location):
-        letter = self._letters[location[0].upper()]
-        return self._board[int(location[1])][letter]
+        """returns the GamePiece (or None) at location, which may be a name like 'E2' or a square index"""
+        number, letter = SQUARE_COORDS[SQUARES[location]]
+        return self._board[number][letter]
 
     def display_board(self):
         """
         prints out the board with row 1/white pieces at the bottom and row 8/black pieces at the top.
         'spaces' on the board are separated by pipes and newlines
         """
-        for row in range(10)[::-1]:  # reverse print so we don't have to translate white pieces at 'A1' to 'A8'
-            print('\n')
-            for space in self._board[row]:
+        print(self.render_board(), end='')
+
+    def render_board(self, style='plain'):
+        """
+        returns the board as a single string instead of printing it. style is one of RENDER_STYLES:
+        'plain' is exactly what display_board() prints, 'ansi' draws colored squares for a terminal and 'compact'
+        is one line of ranks 8 down to 1 split by '/' like the board field of ChessVar.to_text(). Each row's text is
+        cached, and only the rows touched since the last render are rebuilt
+        """
+        if style not in RENDER_STYLES:
+            raise ValueError('unknown render style: ' + str(style))
+        if style not in self._render_cache:
+            self._render_cache[style] = ([-1] * 10, [None] * 10)
+        stamps, rows = self._render_cache[style]
+        for number in range(1, 9):
+            if stamps[number] != self._row_stamps[number]:
+                rows[number] = self._render_row(style, number)
+                stamps[number] = self._row_stamps[number]
+        if style == 'compact':
+            return '/'.join(rows[8:0:-1])
+        if style == 'ansi':
+            return ''.join(rows[8:0:-1]) + ANSI_FILES
+        if rows[0] is None:
+            rows[0] = self._render_row(style, 0)  # the letter rows never change
+        return rows[0] + ''.join(rows[8:0:-1]) + rows[0] + '\n\n'
+
+    def _render_row(self, style, number):
+        """returns the text for one row of render_board() in the given style"""
+        row = self._board[number]
+        if style == 'plain':
+            cells = []
+            for space in row:
                 if space is None:
-                    print(str(space) + ' | ', end=" ")
-                if space is not None:
-                    if space == GamePiece:
-                        print(space.get_shorthand() + '  | ', end=" ")  # a nice little naming scheme to keep the board neat
-                    else:
-                        print(str(space) + '  | ', end=" ")
-        print('\n')
+                    cells.append('None |  ')
+                elif isinstance(space, GamePiece):
+                    cells.append(space.get_shorthand() + '  |  ')  # a nice little naming scheme to keep the board neat
+                else:
+                    cells.append(str(space) + '  |  ')  # row numbers and column letters
+            return '\n\n' + ''.join(cells)
+
+        letters = []
+        for space in row[1:9]:
+            if space is None:
+                letters.append(None)
+            else:
+                shorthand = PIECE_LETTERS[space.get_kind()]
+                letters.append(shorthand if space.get_side() == WHITE else shorthand.lower())
+        if style == 'ansi':
+            cells = [str(number) + ' ']
+            for letter, shorthand in enumerate(letters, 1):
+                background = ANSI_LIGHT if (number + letter) % 2 else ANSI_DARK  # A1 is a dark square
+                if shorthand is None:
+                    cells.append(background + '   ')
+                else:
+                    color = ANSI_WHITE_PIECE if shorthand.isupper() else ANSI_BLACK_PIECE
+                    cells.append(background + color + ' ' + shorthand.upper() + ' ')
+            return ''.join(cells) + ANSI_RESET + '\n'
+
+        text = ''
+        empty = 0
+        for shorthand in letters:
+            if shorthand is None:
+                empty += 1
+                continue
+            if empty:
+                text += str(empty)
+                empty = 0
+            text += shorthand
+        return text + (str(empty) if empty else '')
 
     def get_letters(self):
         """
@@ -98,108 +389,170 @@ class ChessBoard:
         """
         return self._letters
 
-    def check_rook_path(self, start_loc, end_loc, start_letter=None, end_letter=None, start_number=None, end_number=None):
+    def move_piece(self, start, end):
+        """
+        moves whatever is sitting at square index start to square index end and leaves an empty space behind.
+        Anything already at the end space is simply overwritten, so captures have to be recorded first.
+        """
+        start_number, start_letter = SQUARE_COORDS[start]
+        end_number, end_letter = SQUARE_COORDS[end]
+        piece = self._board[start_number][start_letter]
+        self._board[end_number][end_letter] = piece
+        self._board[start_number][start_letter] = None
+        self._occupied = (self._occupied & ~(1 << start)) | 1 << end
+        side = piece.get_side()
+        self._team_masks[side] ^= 1 << start | 1 << end
+        self._team_masks[BLACK - side] &= ~(1 << end)  # whatever was captured there
+        self._row_stamps[start_number] += 1  # so render_board() knows which rows to redraw
+        self._row_stamps[end_number] += 1
+        self._changed |= 1 << start | 1 << end  # and the attack maps know which squares to look at
+
+    def place_piece(self, square, piece):
+        """
+        puts piece (a GamePiece or None) down on square index square, replacing whatever was there. Used to put
+        captured pieces back when a move is undone
+        """
+        number, letter = SQUARE_COORDS[square]
+        old = self._board[number][letter]
+        if old is not None:
+            self._team_masks[old.get_side()] &= ~(1 << square)
+        self._board[number][letter] = piece
+        self._row_stamps[number] += 1
+        self._changed |= 1 << square
+        if piece is None:
+            self._occupied &= ~(1 << square)
+        else:
+            self._occupied |= 1 << square
+            self._team_masks[piece.get_side()] |= 1 << square
+
+    def copy(self, copies):
+        """
+        returns a new board of the same kind holding copies of every piece, so the two can be played separately.
+        copies is a dictionary that gets each original piece mapped to its copy, for fixing up other references
         """
-        checks for obstructions along an x/y-axis between a starting and ending point on the board using recursion
+        board = type(self).__new__(type(self))
+        board._board = [row[:] for row in self._board]
+        for row in board._board[1:9]:
+            for letter in range(1, 9):
+                piece = row[letter]
+                if piece is not None:
+                    row[letter] = copies[piece] = piece.copy()
+        board._occupied = self._occupied
+        board._team_masks = self._team_masks[:]
+        board._row_stamps = self._row_stamps[:]
+        board._render_cache = {}
+        board._changed = self._changed
+        return board
+
+    def take_changes(self):
+        """returns the mask of squares whose contents changed since the last call and starts a new one"""
+        changed = self._changed
+        self._changed = 0
+        return changed
+
+    def get_occupied(self):
+        """returns the occupancy mask for every piece on the board"""
+        return self._occupied
+
+    def get_team_mask(self, team):
+        """returns the occupancy mask for all of one team's pieces"""
+        return self._team_masks[TEAM_CODES[team]]
+
+    def get_team_masks(self):
         """
-        if start_letter is None:  # base case for first square check
-            start_letter = self._letters[start_loc[0].upper()]  # useful block that converts the letter portion of a board coordinate into a numeric
-            end_letter = self._letters[end_loc[0].upper()]  # by defaulting everything to upper() we can take either 'A5' or 'a5' and have the same result
-            start_number = int(start_loc[1])
-            end_number = int(end_loc[1])
-        if end_letter != start_letter and start_number != end_number:  # Rooks can only move X or Y. One of the coordinates must be the same
+        returns the occupancy masks of both teams as a list indexed by team code. This is the live list the board
+        keeps up to date, so treat it as read-only
+        """
+        return self._team_masks
+
+    def is_occupied(self, location):
+        """returns True if location (a name like 'E2' or a square index) holds a piece of either color"""
+        return self._occupied >> SQUARES[location] & 1 == 1
+
+    def check_rook_path(self, start_loc, end_loc):
+        """
+        checks for obstructions along an x/y-axis between a starting and ending point on the board. The squares in
+        between come straight out of the ROOK_BETWEEN table, so the check is one lookup and one mask intersection
+        """
+        between = ROOK_BETWEEN[SQUARES[start_loc] * 64 + SQUARES[end_loc]]
+        if between is None:  # Rooks can only move X or Y. One of the coordinates must be the same
             return False
-        if start_letter == end_letter and start_number == end_number:  # I'm not sure why this needs to be here. I thought my code had outgrown this branch
-            return True                                                 # but it seems to still be necessary for adjacent space movements
+        return between & self._occupied == 0
 
-        if start_number < end_number:  # re: moving 'up' along a letter column
-            if start_number + 1 == end_number:  # using an 'up to but not including' approach, so the recursion will terminate one space before the landing zone
-                return True
-            if self._board[start_number + 1][start_letter] is not None:  # check next space
-                return False
-            else:
-                start_number += 1  # move up one
-                return self.check_rook_path(start_loc, end_loc, start_letter, end_letter, start_number, end_number)
+    def check_bishop_path(self, start_loc, end_loc):
+        """
+        checks for obstructions along a diagonal axis between a starting and ending point on the board using the
+        BISHOP_BETWEEN table
+        """
+        between = BISHOP_BETWEEN[SQUARES[start_loc] * 64 + SQUARES[end_loc]]
+        if between is None:  # not on a shared diagonal
+            return False
+        return between & self._occupied == 0
 
-        if start_number > end_number:  # re: moving 'down' along a letter column
-            if start_number - 1 == end_number:
-                return True
-            if self._board[start_number - 1][start_letter] is not None:  # check next space
-                return False
-            else:
-                start_number -= 1  # move down one
-                return self.check_rook_path(start_loc, end_loc, start_letter, end_letter, start_number, end_number)
 
-        if start_letter < end_letter:  # re: moving 'right' along a row
-            if start_letter + 1 == end_letter:
-                return True
-            if self._board[start_number][start_letter + 1] is not None:  # check next space
-                return False
-            else:
-                start_letter += 1  # move right one
-                return self.check_rook_path(start_loc, end_loc, start_letter, end_letter, start_number, end_number)
+class BitBoard(ChessBoard):
+    """
+    represents the same chess board as ChessBoard, but also tracks the position as 64-bit integers, one per
+    (team, piece type), on top of the occupancy masks every board keeps for each team and for the whole board. Bit n
+    is set when the square with square_index() n holds that kind of piece. The list of lists is kept in step so
+    get_board() and the GamePiece objects still work exactly the same.
+    """
 
-        if start_letter > end_letter:  # re: moving 'left' along a row
-            if start_letter - 1 == end_letter:
-                return True
-            if self._board[start_number][start_letter - 1] is not None:  # check next space
-                return False
-            else:
-                start_letter -= 1  # move left one
-                return self.check_rook_path(start_loc, end_loc, start_letter, end_letter, start_number, end_number)
+    def __init__(self, populate=True):
+        super().__init__(populate)
+        self._pieces = [0] * 12  # team code * 6 + piece type code -> bitboard
+
+        for number in range(1, 9):
+            for letter in range(1, 9):
+                piece = self._board[number][letter]
+                if piece is not None:
+                    self._pieces[piece.get_side() * 6 + piece.get_kind()] |= 1 << square_index(number, letter)
+
+    def get_bitboard(self, team, name):
+        """returns the bitboard for one team's pieces of a single type, e.g. ('White', 'Knight')"""
+        return self._pieces[TEAM_CODES[team] * 6 + PIECE_CODES[name]]
 
-    def check_bishop_path(self, start_loc, end_loc, start_letter = None, end_letter = None, start_number = None, end_number = None):
+    def get_bitboards(self):
         """
-        Checks for obstructions along a diagonal axis between a starting and ending point on the board using recursion
+        returns the 12 bitboards as a list indexed by team code * 6 + piece type code. This is the live list the
+        board keeps up to date, so treat it as read-only
         """
-        if start_letter is None:  # base case for first square check
-            start_letter = self._letters[start_loc[0].upper()]
-            end_letter = self._letters[end_loc[0].upper()]
-            start_number = int(start_loc[1])
-            end_number = int(end_loc[1])
-        if abs(start_letter - end_letter) != abs(start_number - end_number):  # this was a fun bit of math, I actually stumbled on the formula while reviewing chess rules (math formula, not code).
-            return False
-        if start_letter == end_letter and start_number == end_number:
-            return True
-        if start_letter < end_letter and start_number < end_number:  # re: up and to the right
-            if start_letter + 1 == end_letter and start_number + 1 == end_number:  # using an 'up to but not including' approach, so the recursion will terminate one space before the landing zone
-                return True
-            if self._board[start_number+1][start_letter+1] is not None:  # check next space
-                return False
-            else:
-                start_letter += 1  # move right one
-                start_number += 1  # move up one
-                return self.check_bishop_path(start_loc, end_loc, start_letter, end_letter, start_number, end_number)
-
-        if start_letter < end_letter and start_number > end_number:  # re: down and to the right
-            if start_letter + 1 == end_letter and start_number - 1 == end_number:
-                return True
-            if self._board[start_number-1][start_letter+1] is not None:
-                return False
-            else:
-                start_letter += 1  # move right one
-                start_number -= 1  # move down one
-                return self.check_bishop_path(start_loc, end_loc, start_letter, end_letter, start_number, end_number)
-
-        if start_letter > end_letter and start_number > end_number:  # re: down and to the left
-            if start_letter - 1 == end_letter and start_number - 1 == end_number:
-                return True
-            if self._board[start_number-1][start_letter-1] is not None:
-                return False
-            else:
-                start_letter -= 1  # move left one
-                start_number -= 1  # move down one
-                return self.check_bishop_path(start_loc, end_loc, start_letter, end_letter, start_number, end_number)
-
-        if start_letter > end_letter and start_number < end_number:  # re: up and to the left
-            if start_letter - 1 == end_letter and start_number + 1 == end_number:
-                return True
-            if self._board[start_number+1][start_letter-1] is not None:
-                return False
-            else:
-                start_letter -= 1  # move left one
-                start_number += 1  # move up one
-                return self.check_bishop_path(start_loc, end_loc, start_letter, end_letter, start_number, end_number)
+        return self._pieces
+
+    def move_piece(self, start, end):
+        """
+        moves a piece exactly like ChessBoard.move_piece() and updates the bitboards to match. A piece sitting on
+        the end space is cleared out of its own bitboard since it has been captured.
+        """
+        start_number, start_letter = SQUARE_COORDS[start]
+        end_number, end_letter = SQUARE_COORDS[end]
+        piece = self._board[start_number][start_letter]
+        victim = self._board[end_number][end_letter]
+        start_bit = 1 << start
+        end_bit = 1 << end
+
+        if victim is not None:
+            self._pieces[victim.get_side() * 6 + victim.get_kind()] &= ~end_bit
+        self._pieces[piece.get_side() * 6 + piece.get_kind()] ^= start_bit | end_bit
+
+        super().move_piece(start, end)
+
+    def place_piece(self, square, piece):
+        """puts piece (a GamePiece or None) on square index square and updates the bitboards to match"""
+        number, letter = SQUARE_COORDS[square]
+        bit = 1 << square
+        old = self._board[number][letter]
+        if old is not None:
+            self._pieces[old.get_side() * 6 + old.get_kind()] &= ~bit
+        if piece is not None:
+            self._pieces[piece.get_side() * 6 + piece.get_kind()] |= bit
+        super().place_piece(square, piece)
+
+    def copy(self, copies):
+        """returns a copy like ChessBoard.copy() with the bitboards copied too"""
+        board = super().copy(copies)
+        board._pieces = self._pieces[:]
+        return board
 
 
 class GamePiece:
@@ -207,13 +560,25 @@ class GamePiece:
     creates a GamePiece item with name, team, and location. Includes get_() and set_() methods for name, team, and
     location. Designed to be inheritable for use in a small range of virtual boardgames
     Also features a convenient dictionary for converting letters to numerics. Dictionary is tailored to chess
+    Pieces are slotted to keep them small: the name, the type code and the letter dictionary are shared at class
+    level, so each piece only stores its team, team code and location. The location is kept as a square index.
     """
 
+    __slots__ = ('_team', '_side', '_square')
+    _name = None  # each piece class sets its own name and type code once
+    _kind = None
+    _letters = LETTERS  # this dictionary is a lifesaver
+    _jumps = ()  # (row step, letter step) offsets the piece jumps by, whatever is in between
+    _slides = ()  # (row step, letter step) directions the piece slides along until something is in the way
+    _paths = None  # the rest is built from _jumps and _slides by compile_movement()
+    _jump_targets = None
+    _jump_masks = None
+    _rays = None
+
     def __init__(self):
-        self._name = None
         self._team = None
-        self._location = None
-        self._letters = {'A': 1, 'B': 2, 'C': 3, 'D': 4, 'E': 5, 'F': 6, 'G': 7, 'H': 8}  # this dictionary is a lifesaver
+        self._side = None
+        self._square = None
 
     def __str__(self):
         """
@@ -230,184 +595,176 @@ class GamePiece:
         """returns the value of self._team"""
         return self._team
 
+    def get_kind(self):
+        """returns the piece type code (PAWN, KNIGHT, BISHOP, ROOK, QUEEN or KING)"""
+        return self._kind
+
+    def get_side(self):
+        """returns the team code (WHITE or BLACK)"""
+        return self._side
+
     def get_shorthand(self):
         """returns the shorthand used in the __str__ method"""
         return self._team[0] + self._name[0:2]
 
     def get_location(self):
-        """returns the value of self._location"""
-        return self._location
+        """returns the piece's location as a name like 'E2'"""
+        return None if self._square is None else SQUARE_NAMES[self._square]
+
+    def get_square(self):
+        """returns the piece's location as a square index"""
+        return self._square
 
     def set_location(self, new_loc):
-        """allows user to change the value of self._location"""
-        self._location = new_loc.upper()
+        """
+        allows user to change the piece's location. new_loc may be a name like 'e2', a square index, or None for a
+        piece that isn't on the board
+        """
+        self._square = None if new_loc is None else SQUARES[new_loc]
 
     def get_letters(self):
         """returns the letter dictionary used for numeric conversion"""
         return self._letters
 
+    def get_paths(self, take):
+        """
+        returns the piece's compiled move table: for start square index * 64 + end square index, None if it can't
+        move that way, otherwise the mask of squares that must be empty. take (is it a capture) only matters to Pawns
+        """
+        return self._paths
+
+    def get_jumps(self, square):
+        """returns the square indexes the piece can jump to from square index square"""
+        return self._jump_targets[square]
+
+    def get_jump_mask(self, square):
+        """returns get_jumps() as a mask"""
+        return self._jump_masks[square]
+
+    def get_rays(self, square):
+        """returns the squares along each of the piece's slide directions from square index square, nearest first"""
+        return self._rays[square]
+
+    def get_slides(self):
+        """returns the directions the piece slides along, empty for pieces that only jump"""
+        return self._slides
+
+    def check_move(self, start_loc, end_loc):
+        """
+        returns True if the piece, sitting on start_loc, can get to end_loc by its own movement and False if the
+        proposed new location is illegal. Whether anything is in the way is left to ChessVar.
+        """
+        start = SQUARES[start_loc]  # names ('A5' or 'a5') and square indexes all come out as a square index
+        end = SQUARES[end_loc]
+        return self._square == start and self._paths[start * 64 + end] is not None
+
+    def copy(self):
+        """returns a new piece of the same type, team and location"""
+        piece = type(self).__new__(type(self))
+        piece._team = self._team
+        piece._side = self._side
+        piece._square = self._square
+        return piece
+
 
 class King(GamePiece):
     """
     Represents a GamePiece that is the King in a game of Chess. Inherits methods and members from GamePiece class.
     Initializes members to determine which team (white or black) the King is playing for and where it will start on
-    the board. Introduces additional method, move(), which uses logical computing to determine if a proposed movement is
-    legal or not. Designed specifically for use with the ChessVar class and its methods
+    the board. Moves one square in any direction.
+    Designed specifically for use with the ChessVar class and its methods
     """
 
+    __slots__ = ()
+    _name = 'King'
+    _kind = KING
+    _jumps = ORTHOGONAL_STEPS + DIAGONAL_STEPS
+
     def __init__(self, color, location):
-        super().__init__()  # recovers the dictionary
-        self._name = 'King'
+        super().__init__()
         self._team = color
-        self._location = location
-
-    def check_move(self, start_loc, end_loc):
-        """
-        outlines the movement limitations of the King-piece (one square in any direction) and returns False if the
-        proposed new location (end_loc) is illegal.
-        """
-        start_letter = self._letters[start_loc[0].upper()]  # this block (or a variant) is present in most classes and methods going forward
-        end_letter = self._letters[end_loc[0].upper()]      # This makes it so that all letter coordinates are turned into a callable numeric
-        start_number = int(start_loc[1])
-        end_number = int(end_loc[1])
-        if self._location != start_loc.upper():
-            return False
-        if end_letter > start_letter + 1 or end_letter < start_letter - 1:
-            return False
-        if end_number > start_number + 1 or end_number < start_number - 1:
-            return False
-        else:
-            return True
+        self._side = TEAM_CODES[color]
+        self._square = SQUARES[location]
 
 
 class Queen(GamePiece):
     """
     Represents a GamePiece that is the Queen in a game of Chess. Inherits methods and members from GamePiece class.
     Initializes members to determine which team (white or black) the Queen is playing for and where it will start on
-    the board. Introduces additional method, move(), which uses logical computing to determine if a proposed movement is
-    legal or not. Designed specifically for use with the ChessVar class and its methods
+    the board. Slides any number of squares in any direction.
+    Designed specifically for use with the ChessVar class and its methods
     """
 
+    __slots__ = ()
+    _name = 'Queen'
+    _kind = QUEEN
+    _slides = ORTHOGONAL_STEPS + DIAGONAL_STEPS  # the queen is just a bishop/rook hybrid
+
     def __init__(self, color, location):
         super().__init__()
-        self._name = 'Queen'
         self._team = color
-        self._location = location
-
-    def check_move(self, start_loc, end_loc):
-        """
-        outlines the movement limitations of the Queen-piece (unlimited squares in any direction, unobstructed)
-        and returns False if the proposed new location (end_loc) is illegal.
-        """
-        start_letter = self._letters[start_loc[0].upper()]
-        end_letter = self._letters[end_loc[0].upper()]
-        start_number = int(start_loc[1])
-        end_number = int(end_loc[1])
-        if self._location != start_loc.upper():
-            return False
-        if abs(start_letter - end_letter) == abs(start_number - end_number):  # the queen is just a bishop/rook hybrid so the same rules from the check_?_path() method will suffice
-            return True
-        if end_letter == start_letter or end_number == start_number:
-            return True
-        else:
-            return False
+        self._side = TEAM_CODES[color]
+        self._square = SQUARES[location]
 
 
 class Rook(GamePiece):
     """
     Represents a GamePiece that is a Rook in a game of Chess. Inherits methods and members from GamePiece class.
     Initializes members to determine which team (white or black) the Rook is playing for and where it will start on
-    the board. Introduces additional method, move(), which uses logical computing to determine if a proposed movement is
-    legal or not. Designed specifically for use with the ChessVar class and its methods
+    the board. Slides any number of squares along a row or letter.
+    Designed specifically for use with the ChessVar class and its methods
     """
 
+    __slots__ = ()
+    _name = 'Rook'
+    _kind = ROOK
+    _slides = ORTHOGONAL_STEPS
+
     def __init__(self, color, location):
         super().__init__()
-        self._name = 'Rook'
         self._team = color
-        self._location = location
-
-    def check_move(self, start_loc, end_loc):
-        """
-        outlines the movement limitations of the Rook-piece (unlimited squares in any direction along an x or y-axis,
-        unobstructed) and returns False if the proposed new location (new_loc) is illegal.
-        """
-        start_letter = self._letters[start_loc[0].upper()]
-        end_letter = self._letters[end_loc[0].upper()]
-        start_number = int(start_loc[1])
-        end_number = int(end_loc[1])
-        if self._location != start_loc.upper():
-            return False
-        if end_letter == start_letter or end_number == start_number:  # same as 'rook section' on Queen
-            return True
-        else:
-            return False
+        self._side = TEAM_CODES[color]
+        self._square = SQUARES[location]
 
 
 class Knight(GamePiece):
     """
     Represents a GamePiece that is a Knight in a game of Chess. Inherits methods and members from GamePiece class.
     Initializes members to determine which team (white or black) the Knight is playing for and where it will start on
-    the board. Introduces additional method, move(), which uses logical computing to determine if a proposed movement is
-    legal or not. Designed specifically for use with the ChessVar class and its methods
+    the board. Jumps in an L, over anything in between.
+    Designed specifically for use with the ChessVar class and its methods
     """
 
+    __slots__ = ()
+    _name = 'Knight'
+    _kind = KNIGHT
+    _jumps = KNIGHT_OFFSETS  # knights are the only piece in chess that may disregard path obstructions
+
     def __init__(self, color, location):
         super().__init__()
-        self._name = 'Knight'
         self._team = color
-        self._location = location
-
-    def check_move(self, start_loc, end_loc):
-        """
-        outlines the movement limitations of the Knight-piece (two spaces + one space to 90 degrees or one
-        space + two spaces to 90 degrees any direction) and returns False if the proposed new location (new_loc) is
-        illegal. Knights are the only piece in chess that may disregard path obstructions.
-        """
-        start_letter = self._letters[start_loc[0].upper()]
-        end_letter = self._letters[end_loc[0].upper()]
-        start_number = int(start_loc[1])
-        end_number = int(end_loc[1])
-        if self._location != start_loc.upper():
-            return False
-        if abs(start_letter - end_letter) == 2 and abs(start_number - end_number) == 1:  # knights move 2 vert and 1 horizontal or 1 vert and two horizontal in any direction. abs() saves the day again
-            return True
-        if abs(start_letter - end_letter) == 1 and abs(start_number - end_number) == 2:
-            return True
-        else:
-            return False
+        self._side = TEAM_CODES[color]
+        self._square = SQUARES[location]
 
 
 class Bishop(GamePiece):
     """
     Represents a GamePiece that is a Bishop in a game of Chess. Inherits methods and members from GamePiece class.
     Initializes members to determine which team (white or black) the Bishop is playing for and where it will start on
-    the board. Introduces additional method, move(), which uses logical computing to determine if a proposed movement is
-    legal or not. Designed specifically for use with the ChessVar class and its methods
+    the board. Slides any number of squares along a diagonal.
+    Designed specifically for use with the ChessVar class and its methods
     """
 
+    __slots__ = ()
+    _name = 'Bishop'
+    _kind = BISHOP
+    _slides = DIAGONAL_STEPS
+
     def __init__(self, color, location):
         super().__init__()
-        self._name = 'Bishop'
         self._team = color
-        self._location = location
-
-
-    def check_move(self, start_loc, end_loc):
-        """
-        outlines the movement limitations of the Bishop-piece (unlimited squares along a diagonal axis, unobstructed)
-        and returns False if the proposed new location (new_loc) is illegal.
-        """
-        start_letter = self._letters[start_loc[0].upper()]
-        end_letter = self._letters[end_loc[0].upper()]
-        start_number = int(start_loc[1])
-        end_number = int(end_loc[1])
-        if self._location != start_loc.upper():
-            return False
-        if abs(start_letter - end_letter) == abs(start_number - end_number):  # same as 'bishop section' on Queen
-            return True
-        else:
-            return False
+        self._side = TEAM_CODES[color]
+        self._square = SQUARES[location]
 
 
 class Pawn(GamePiece):
@@ -415,16 +772,20 @@ class Pawn(GamePiece):
     Represents a GamePiece that is a Pawn in a game of Chess. Inherits methods and members from GamePiece class.
     Initializes members to determine which team (white or black) the Pawn is playing for and where it will start on
     the board. Pawn introduces an additional member, first_move, that is initialized to True, reflecting that the piece
-    has not made any moves to start the game. Introduces additional method, move(), which uses logical computing to
-    determine if a proposed movement is legal or not. Designed specifically for use with the ChessVar class and its
-    methods
+    has not made any moves to start the game. Its rules don't fit the jumps and slides the other pieces declare, so
+    they are compiled into their own tables by _build_pawn_tables(). Designed specifically for use with the ChessVar
+    class and its methods
     """
 
+    __slots__ = ('_first_move',)
+    _name = 'Pawn'
+    _kind = PAWN
+
     def __init__(self, color, location):
         super().__init__()
-        self._name = 'Pawn'
         self._team = color
-        self._location = location
+        self._side = TEAM_CODES[color]
+        self._square = SQUARES[location]
         self._first_move = True  # used by ChessVar make_move() method to determine pawn movement legality
 
     def get_move(self):
@@ -434,44 +795,150 @@ class Pawn(GamePiece):
         """
         return self._first_move
 
+    def set_move(self, first_move):
+        """
+        allows ChessVar to put the first_move flag back when a move is undone
+        """
+        self._first_move = first_move
+
+    def copy(self):
+        """returns a new Pawn with the same team, location and first_move flag"""
+        piece = super().copy()
+        piece._first_move = self._first_move
+        return piece
+
+    def get_paths(self, take):
+        """returns the Pawn's move table for captures (take True) or plain moves, which depends on first_move"""
+        return PAWN_PATHS[take][self._side][self._first_move]
+
     def check_move(self, start_loc, end_loc, take):
         """
         outlines the movement limitations of the Pawn-piece (two squares on first turn, one square on subsequent turns,
         may only 'take' diagonally. All moves must be forward from starting side) and returns False if the proposed new
-        location (new_loc) is illegal.
+        location (new_loc) is illegal. Only checks: the first_move flag is cleared by ChessVar once the move is made.
+        The rules themselves are compiled into PAWN_PATHS by _build_pawn_tables().
+        """
+        start = SQUARES[start_loc]  # names ('A5' or 'a5') and square indexes all come out as a square index
+        end = SQUARES[end_loc]
+        return self._square == start and PAWN_PATHS[take][self._side][self._first_move][start * 64 + end] is not None
+
+
+PIECE_CLASSES = (Pawn, Knight, Bishop, Rook, Queen, King)  # piece type code -> GamePiece subclass
+
+
+def compile_movement(piece_class):
+    """
+    builds the lookup tables for piece_class from its declared _jumps and _slides: the move table make_move()
+    checks (see _build_move_paths()) plus the jump targets, jump masks and rays the move generators and attack maps
+    walk. Done once per class at import, and by register_piece()
+    """
+    piece_class._paths = _build_move_paths(piece_class._jumps, piece_class._slides)
+    piece_class._jump_targets = _build_jump_table(piece_class._jumps)
+    piece_class._jump_masks = [sum(1 << end for end in ends) for ends in piece_class._jump_targets]
+    piece_class._rays = _build_ray_table(piece_class._slides)
+
+
+for piece_class in PIECE_CLASSES[1:]:  # the Pawn has its own tables, see _build_pawn_tables()
+    compile_movement(piece_class)
+PIECE_PATHS = (None,) + tuple(piece_class._paths for piece_class in PIECE_CLASSES[1:])  # type code -> move table
+
+
+def register_piece(name, jumps=(), slides=(), counts_as='Knight'):
+    """
+    defines an extra (fairy) piece type from its movement and returns its GamePiece class, e.g.
+    register_piece('Archbishop', jumps=KNIGHT_OFFSETS, slides=DIAGONAL_STEPS, counts_as='Bishop'). Its moves are
+    compiled like the standard pieces', so make_move() and the move generators handle it with no extra code. Put
+    one on the board with ChessVar.place_piece(). Everything else about it (capture tallies and victory, the
+    position hash, to_text()/to_bytes(), batch_eval.py and tablebase.py) treats it as the counts_as type, since
+    those only know the six standard ones. Pawns have their own rules, so nothing can count as one.
+    """
+    if counts_as not in PIECE_CODES or counts_as == 'Pawn':
+        raise ValueError('counts_as must be a standard piece other than Pawn: ' + str(counts_as))
+
+    class FairyPiece(GamePiece):
+        __slots__ = ()
+        _name = name
+        _kind = PIECE_CODES[counts_as]
+        _jumps = tuple(jumps)
+        _slides = tuple(slides)
+
+        def __init__(self, color, location):
+            super().__init__()
+            self._team = color
+            self._side = TEAM_CODES[color]
+            self._square = SQUARES[location]
+
+    FairyPiece.__name__ = FairyPiece.__qualname__ = name
+    compile_movement(FairyPiece)
+    return FairyPiece
+
+
+class TranspositionTable:
+    """
+    represents a fixed-size cache of search results keyed by ChessVar position hashes. Each key maps to one slot
+    (key modulo the size), so the table never grows. When two positions land in the same slot the policy is
+    depth-preferred: an entry is only replaced by the same position, a search at least as deep, or anything from an
+    older search generation (see new_search()). Tracks hits, misses, stores and replacements for tuning. One table
+    can be shared by any number of games.
+    """
+
+    EXACT = 0  # stored value is the true score
+    LOWER_BOUND = 1  # search failed high, the true score is at least value
+    UPPER_BOUND = 2  # search failed low, the true score is at most value
+
+    def __init__(self, size=1 << 16):
+        self._size = size
+        self._slots = [None] * size  # each slot is None or (key, depth, value, flag, move, generation)
+        self._generation = 0
+        self._hits = 0
+        self._misses = 0
+        self._stores = 0
+        self._replaced = 0
+        self._rejected = 0
+
+    def probe(self, key):
+        """returns the (depth, value, flag, move) stored for key, or None if the position isn't in the table"""
+        entry = self._slots[key % self._size]
+        if entry is not None and entry[0] == key:
+            self._hits += 1
+            return entry[1:5]
+        self._misses += 1
+        return None
+
+    def store(self, key, depth, value, flag=EXACT, move=None):
+        """
+        saves a search result for key if the replacement policy allows it. Returns True if it was stored
         """
-        start_letter = self._letters[start_loc[0].upper()]
-        end_letter = self._letters[end_loc[0].upper()]
-        start_number = int(start_loc[1])
-        end_number = int(end_loc[1])
-        if self._location != start_loc.upper():
+        index = key % self._size
+        entry = self._slots[index]
+        if entry is not None and entry[0] != key and entry[1] > depth and entry[5] == self._generation:
+            self._rejected += 1  # a deeper result for a different position from this search wins the slot
             return False
-        if self._first_move is True and self._team == 'White':
-            if end_number > 4 or end_number < start_number:
-                return False
-        if self._first_move is True and self._team == 'Black':
-            if end_number < 5 or end_number > start_number:
-                return False
-        if self._first_move is False and self._team == 'White':
-            if end_number > start_number + 1 or end_number < start_number:
-                return False
-        if self._first_move is False and self._team == 'Black':
-            if end_number < start_number - 1 or end_number > start_number:
-                return False
-        if take is True:
-            if end_letter > start_letter + 1 or end_letter < start_letter - 1 or end_letter == start_letter:
-                return False
-            else:
-                if self._first_move is True:
-                    self._first_move = False
-                return True
-        if take is False:
-            if end_letter != start_letter:
-                return False
-            else:
-                if self._first_move is True:
-                    self._first_move = False
-                return True
+        if entry is not None and entry[0] != key:
+            self._replaced += 1
+        self._slots[index] = (key, depth, value, flag, move, self._generation)
+        self._stores += 1
+        return True
+
+    def new_search(self):
+        """marks the start of a new search so entries left over from earlier searches may be replaced freely"""
+        self._generation += 1
+
+    def clear(self):
+        """empties the table and resets the statistics"""
+        self.__init__(self._size)
+
+    def get_stats(self):
+        """returns a dictionary of the table's size, how many slots are filled and the hit/miss/store counters"""
+        lookups = self._hits + self._misses
+        return {'size': self._size,
+                'used': self._size - self._slots.count(None),
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': self._hits / lookups if lookups else 0.0,
+                'stores': self._stores,
+                'replaced': self._replaced,
+                'rejected': self._rejected}
 
 
 class ChessVar:
@@ -480,37 +947,265 @@ class ChessVar:
     movements (castling, en passant, etc.) and modified victory conditions (game ends with one team's capture of all
     opponent pieces of the same type). The 'game board' is represented by a 2D dictionary array wherein the keys
     represent a space on the board and the values are either 'None' (indicating an open space) or a GamePiece item.
+    Passing bitboard=True runs the game on a BitBoard instead of a plain ChessBoard. The rules are identical either way.
+    Positions can be saved and loaded with to_text()/from_text() and to_bytes()/from_bytes(), and compact() packs an
+    idle game into a CompactGame.
     """
 
-    def __init__(self):
+    _letters = LETTERS
+
+    def __init__(self, bitboard=False, populate=True):
+        self._sharers = [1]  # how many forked games share this game's board, pieces and lists, see fork()
         self._game_state = 'UNFINISHED'
         self._black_taken = []  # these will be the repositories for taken pieces. Eventually we'll use these lists to determine victory conditions
         self._white_taken = []
-        self._which_turn = 'White'
-        self._board = ChessBoard()
-        self._letters = {'A': 1, 'B': 2, 'C': 3, 'D': 4, 'E': 5, 'F': 6, 'G': 7, 'H': 8}
+        self._white_captures = []  # shorthand views of the taken pieces, kept up to date by take_piece()
+        self._black_captures = []
+        self._capture_counts = [[0] * 6, [0] * 6]  # team code -> captures of each piece type code
+        self._which_turn = WHITE  # team code of the side to move
+        self._bitboard = bitboard
+        self._board = BitBoard(populate) if bitboard else ChessBoard(populate)  # populate=False starts from an empty board
+        self._history = []  # undo records for moves made with push_move()
+        self._hash = self._compute_hash() if populate else 0  # an empty board with no captures hashes to 0
+        self._attacks = None  # piece -> (square index, mask of squares it attacks), built when first asked for
+        self._team_attacks = [0, 0]  # team code -> mask of every square the team attacks
+        self._legal_hash = None  # position hash the is_legal() answers in _legal_cache belong to
+        self._legal_cache = {}  # start square index * 64 + end square index -> True/False
 
     def get_game_state(self):
         """returns the value of self._game_state"""
         return self._game_state
 
     def get_turn(self):
-        """returns value of self._which_turn"""
-        return self._which_turn
+        """returns the team whose turn it is, 'White' or 'Black'"""
+        return TEAM_NAMES[self._which_turn]
+
+    def get_position(self, location):
+        """returns the GamePiece (or None) sitting at location, e.g. 'E2'"""
+        return self._board.get_position(location)
+
+    def legal_moves(self):
+        """
+        returns a list of every legal (start, end) move for the team whose turn it is, e.g. [('A2', 'A3'), ...].
+        Moves come from the jump and ray tables rather than from trying check_move() on every pair of squares, so
+        the game is never touched. Only the squares in the side to move's team mask are looked at, lowest square
+        index first. A finished game has no legal moves.
+        """
+        if self._game_state != 'UNFINISHED':
+            return []
+        board = self._board.get_board()
+        own = self._board.get_team_masks()[self._which_turn]
+        moves = []
+        while own:
+            start = (own & -own).bit_length() - 1
+            own &= own - 1
+            number, letter = SQUARE_COORDS[start]
+            for end in self._piece_targets(board[number][letter], start):
+                moves.append((SQUARE_NAMES[start], SQUARE_NAMES[end]))
+        return moves
+
+    def legal_moves_from(self, start_loc):
+        """
+        returns a list of the legal (start, end) moves for the piece at start_loc. An empty space, a piece whose
+        turn it isn't or a finished game all return an empty list.
+        """
+        start = SQUARES[start_loc]
+        number, letter = SQUARE_COORDS[start]
+        piece = self._board.get_board()[number][letter]
+        if self._game_state != 'UNFINISHED' or piece is None or piece.get_side() != self._which_turn:
+            return []
+        return [(SQUARE_NAMES[start], SQUARE_NAMES[end]) for end in self._piece_targets(piece, start)]
+
+    def _piece_targets(self, piece, start):
+        """
+        returns a list of the square indexes that piece (sitting on square index start) may legally move to. Used
+        by the legal move generators. Built from the same compiled tables make_move() looks moves up in,
+        so the rules match exactly, including the Pawn quirks: no path check on the two-space first move and sideways captures.
+        Whose pieces stand where comes from the board's team masks, so no other piece is looked at.
+        """
+        team = piece.get_side()
+        masks = self._board.get_team_masks()
+        own = masks[team]
+        enemy = masks[BLACK - team]
+        occupied = own | enemy
+        targets = []
+
+        if piece.get_kind() == PAWN:
+            for end, take in PAWN_TARGETS[team][piece.get_move()][start]:
+                if enemy >> end & 1 if take else not occupied >> end & 1:
+                    targets.append(end)  # captures need an enemy piece, straight moves an open space
+            return targets
+
+        for end in piece.get_jumps(start):
+            if not own >> end & 1:
+                targets.append(end)
+        rays = piece.get_rays(start)
+        for ray in rays:
+            for end in ray:
+                if not occupied >> end & 1:
+                    targets.append(end)
+                else:
+                    if enemy >> end & 1:
+                        targets.append(end)
+                    break  # the ray is blocked past the first piece it hits
+        if rays and targets and piece.get_jump_mask(start):
+            targets = list(dict.fromkeys(targets))  # a piece that both jumps and slides can reach a square both ways
+        return targets
+
+    def _piece_attacks(self, piece, square):
+        """
+        returns the mask of squares piece (sitting on square index square) attacks: every square it could capture
+        on if an enemy piece stood there, squares holding its own team's pieces included
+        """
+        if piece.get_kind() == PAWN:
+            return PAWN_ATTACKS[piece.get_side()][piece.get_move()][square]
+        occupied = self._board.get_occupied()
+        mask = piece.get_jump_mask(square)
+        for ray in piece.get_rays(square):
+            for end in ray:
+                mask |= 1 << end
+                if occupied >> end & 1:
+                    break  # the ray stops at the first piece, whoever it belongs to
+        return mask
+
+    def _attack_map(self):
+        """
+        returns the attack map (piece -> (square index, attack mask)) brought up to date with the board. Moves only
+        mark the squares they change, and the work is done here when the map is next needed: pieces standing on a
+        changed square are redone, and so are sliding pieces (Rooks, Bishops, Queens) whose attacks reached one, since a slider's
+        attacks can't change unless a square along them did. Everything else is left alone.
+        """
+        board = self._board
+        changed = board.take_changes()
+        attacks = self._attacks
+        if attacks is None:
+            attacks = self._attacks = {}
+            changed = board.get_occupied()  # first use: every piece is new
+        elif not changed:
+            return attacks
+        grid = board.get_board()
+        for piece, (square, mask) in list(attacks.items()):
+            number, letter = SQUARE_COORDS[square]
+            if grid[number][letter] is not piece:
+                del attacks[piece]  # moved away or captured, picked up again below if it's still on the board
+            elif changed >> square & 1 or (mask & changed and piece.get_slides()):
+                attacks[piece] = (square, self._piece_attacks(piece, square))
+        landed = changed & board.get_occupied()
+        while landed:
+            square = (landed & -landed).bit_length() - 1
+            landed &= landed - 1
+            number, letter = SQUARE_COORDS[square]
+            piece = grid[number][letter]
+            if piece not in attacks:
+                attacks[piece] = (square, self._piece_attacks(piece, square))
+        team_attacks = self._team_attacks  # updated in place, a forked game that shares the map shares this too
+        team_attacks[WHITE] = team_attacks[BLACK] = 0
+        white = board.get_team_masks()[WHITE]
+        for piece, (square, mask) in attacks.items():
+            team_attacks[BLACK - (white >> square & 1)] |= mask
+        return attacks
+
+    def attackers_of(self, location, team=None):
+        """
+        returns the pieces attacking location (a name like 'E4' or a square index), or only team's ('White' or
+        'Black') if team is given. A piece attacks every square it could capture on, whatever is standing there.
+        """
+        bit = 1 << SQUARES[location]
+        side = None if team is None else TEAM_CODES[team]
+        return [piece for piece, (square, mask) in self._attack_map().items()
+                if mask & bit and (side is None or piece.get_side() == side)]
+
+    def is_attacked(self, location, team):
+        """returns True if any of team's pieces attack location (a name like 'E4' or a square index)"""
+        self._attack_map()
+        return self._team_attacks[TEAM_CODES[team]] >> SQUARES[location] & 1 == 1
+
+    def get_threatened(self, team):
+        """
+        returns team's pieces that the other team attacks, i.e. the ones it could lose next move. Pair with
+        attackers_of() to tell defended pieces from hanging ones
+        """
+        side = TEAM_CODES[team]
+        attacks = self._attack_map()
+        threatened = self._board.get_team_masks()[side] & self._team_attacks[BLACK - side]
+        return [piece for piece, (square, mask) in attacks.items() if threatened >> square & 1]
+
+    def get_hash(self):
+        """
+        returns the 64-bit Zobrist hash of the current position. It covers piece placement (including which Pawns
+        still have their first move), the side to move and each team's capture counts, so two games that reach the
+        same position by different move orders share a hash.
+        """
+        return self._hash
+
+    def _compute_hash(self):
+        """
+        works out the position hash from scratch. make_move() and take_piece() keep it up to date after that. A
+        BitBoard game reads the placement straight off its per-type bitboards and only looks at its Pawns for the
+        first_move flag
+        """
+        board = self._board.get_board()
+        result = 0
+        if self._bitboard:
+            for index, bits in enumerate(self._board.get_bitboards()):
+                keys = ZOBRIST_PIECES[index]
+                while bits:
+                    square = (bits & -bits).bit_length() - 1
+                    bits &= bits - 1
+                    result ^= keys[square]
+                    if index % 6 == PAWN:
+                        number, letter = SQUARE_COORDS[square]
+                        if board[number][letter].get_move():
+                            result ^= ZOBRIST_FIRST_MOVE[index // 6][square]
+        else:
+            for square in range(64):
+                number, letter = SQUARE_COORDS[square]
+                piece = board[number][letter]
+                if piece is not None:
+                    result ^= ZOBRIST_PIECES[piece.get_side() * 6 + piece.get_kind()][square]
+                    if piece.get_kind() == PAWN and piece.get_move():
+                        result ^= ZOBRIST_FIRST_MOVE[piece.get_side()][square]
+        for side in (WHITE, BLACK):
+            for kind in range(6):
+                result ^= ZOBRIST_CAPTURES[side * 6 + kind][self._capture_counts[side][kind]]
+        if self._which_turn == BLACK:
+            result ^= ZOBRIST_BLACK_TO_MOVE
+        return result
+
+    def best_move(self, depth=4, time_limit=None, table=None, book=None, tablebase=None):
+        """
+        searches the current position with the built-in engine (see engine.py) and returns the best (start, end)
+        move it finds for the team whose turn it is, or None if there are no legal moves. depth caps the iterative
+        deepening and time_limit (seconds) stops the search early with the deepest finished answer. Pass a shared
+        TranspositionTable as table to keep search results between calls, and an OpeningBook (see opening_book.py)
+        as book to play book moves without searching, and a Tablebase (see tablebase.py) as tablebase to play
+        covered endings exactly. The game is left exactly as it was.
+        """
+        from engine import search  # engine.py builds on this module, so it's only pulled in when it's needed
+        return search(self, depth, time_limit, table, book, tablebase)['move']
 
     def get_white_captures(self):
-        """returns the list of pieces that white has captured"""
-        taken = []
-        for piece in self._white_taken:
-            taken.append(piece.get_shorthand())  # save the massive item handle
-        return taken
+        """returns a new list of the pieces that white has captured, so changing it doesn't touch the game"""
+        return list(self._white_captures)
 
     def get_black_captures(self):
-        """returns the list of pieces that white has captured"""
-        taken = []
-        for piece in self._black_taken:
-            taken.append(piece.get_shorthand())
-        return taken
+        """returns a new list of the pieces that black has captured, so changing it doesn't touch the game"""
+        return list(self._black_captures)
+
+    def get_piece_count(self):
+        """returns how many pieces of either color are on the board"""
+        return bin(self._board.get_occupied()).count('1')
+
+    def get_capture_counts(self, team):
+        """returns a dictionary of how many pieces of each type the given team has captured, e.g. {'Pawn': 3, ...}"""
+        return dict(zip(PIECE_NAMES, self._capture_counts[TEAM_CODES[team]]))
+
+    def get_capture_tallies(self, team):
+        """
+        returns the given team's capture counts as a list indexed by piece type code, e.g. tallies[PAWN]. This is the
+        live list the game keeps up to date, so treat it as read-only
+        """
+        return self._capture_counts[TEAM_CODES[team]]
 
     def display_board(self):
         """
@@ -518,235 +1213,619 @@ class ChessVar:
         """
         return self._board.display_board()
 
+    def render_board(self, style='plain'):
+        """returns the board as a string, see ChessBoard.render_board() for the styles"""
+        return self._board.render_board(style)
+
+    def fork(self):
+        """
+        returns a new game in the same position that can be played separately, e.g. to try out a line. Nothing is
+        copied up front: the two games share the board, the pieces, the capture lists and the undo records until one
+        of them makes, takes back or resets a move, and only that game copies them then (copy-on-write)
+        """
+        child = type(self).__new__(type(self))
+        child.__dict__.update(self.__dict__)
+        self._sharers[0] += 1  # both games now hold the same _sharers list
+        return child
+
+    def __copy__(self):
+        """copy.copy() of a game is a fork(), so the copy is counted as sharing everything with this game"""
+        return self.fork()
+
+    def __del__(self):
+        """a game that goes away stops counting as a sharer, so the last game left sharing can skip the copy"""
+        self._sharers[0] -= 1
+
+    def _unshare(self):
+        """
+        gives this game its own copies of everything fork() shares, just before it changes any of it. Pieces are
+        copied once each and every reference to them (board, capture lists, undo records) is pointed at the copy
+        """
+        self._sharers[0] -= 1
+        self._sharers = [1]
+        copies = {}
+        self._board = self._board.copy(copies)
+        self._attacks = None  # keyed by the shared pieces, so it's rebuilt for the copies when next asked for
+        self._team_attacks = [0, 0]
+        for taken in (self._white_taken, self._black_taken):
+            for piece in taken:
+                if piece not in copies:
+                    copies[piece] = piece.copy()
+        history = []
+        for record in self._history:
+            captured = record[2]
+            if captured is not None:
+                if captured not in copies:
+                    copies[captured] = captured.copy()
+                record = record[:2] + (copies[captured],) + record[3:]
+            history.append(record)
+        self._history = history
+        self._white_taken = [copies[piece] for piece in self._white_taken]
+        self._black_taken = [copies[piece] for piece in self._black_taken]
+        self._white_captures = self._white_captures[:]
+        self._black_captures = self._black_captures[:]
+        self._capture_counts = [counts[:] for counts in self._capture_counts]
+
     def make_move(self, start_loc, end_loc):
         """
-        checks start_loc on game board for a piece and uses piece method get_team() to verify against self._which_turn
-        that the piece may legally move this turn. The start and end loc's are fed to piece method check_move() to
-        determine if the move is legal. make_mov then checks board for obstructions using ChessBoard methods
-        before updating the game board to reflect the move and exchange the turn count while calling piece method
-        set_location() to reflect the move in the piece itself.
+        checks start_loc on game board for a piece and uses piece method get_side() to verify against self._which_turn
+        that the piece may legally move this turn. The start and end loc's are looked up in the piece's compiled move
+        table (get_paths()), which says in one step whether the piece can move that way and which squares have to be
+        clear, and the board's occupancy mask is checked against that before updating the game board to reflect the
+        move and exchange the turn count while calling piece method set_location() to reflect the move in the piece itself.
         Illegal moves return 'False' and legal moves return 'True'
         """
         if self._game_state != 'UNFINISHED':  # If the game is complete, simply return False
             return False
 
-        start_letter = self._letters[start_loc[0].upper()]
-        end_letter = self._letters[end_loc[0].upper()]
-        start_number = int(start_loc[1])
-        end_number = int(end_loc[1])
-        start = self._board.get_board()[start_number][start_letter]  # the represents the actual value (GamePiece or None) at the starting position of the board
-        end = self._board.get_board()[end_number][end_letter]  # the represents the actual value (GamePiece or None) at the end position of the board
-        if start is None or start.get_team() != self._which_turn:
+        start_square = SQUARES[start_loc]  # the only place the locations get parsed, everything past here uses square indexes
+        end_square = SQUARES[end_loc]
+        masks = self._board.get_team_masks()
+        own = masks[self._which_turn]
+        if not own >> start_square & 1:
             return False  # accounts for an empty starting space or for the wrong color piece
-        if end is None:  # moving to an empty space
-
-            if start.get_name() == 'King' or start.get_name() == 'Knight':
-                if start.check_move(start_loc, end_loc) is True:  # these pieces don't have special path checks
-                    self._board.get_board()[end_number][end_letter] = start  # move piece to end_loc
-                    self._board.get_board()[start_number][start_letter] = None  # leave an empty space behind at start_loc
-                    self._board.get_board()[end_number][end_letter].set_location(end_loc.upper())  # update the GamePiece's own location data member
-                    if self._which_turn == 'White':
-                        self._which_turn = 'Black'  # adjust for next turn
-                        return True
-                    elif self._which_turn == 'Black':
-                        self._which_turn = 'White'
-                        return True
-                return False
-
-            if start.get_name() == 'Pawn':
-                if start.check_move(start_loc, end_loc, False) is True:  # False because not taking
-                    self._board.get_board()[end_number][end_letter] = start
-                    self._board.get_board()[start_number][start_letter] = None
-                    self._board.get_board()[end_number][end_letter].set_location(end_loc.upper())
-                    if self._which_turn == 'White':
-                        self._which_turn = 'Black'
-                        return True
-                    elif self._which_turn == 'Black':
-                        self._which_turn = 'White'
-                        return True
-                return False
-
-            if start.get_name() == 'Queen':
-                if start.check_move(start_loc, end_loc) is True:
-                    if self._board.check_bishop_path(start_loc, end_loc) is True or self._board.check_rook_path(start_loc, end_loc) is True:  # call the GameBoard path check methods to ensure a clear path
-                        self._board.get_board()[end_number][end_letter] = start
-                        self._board.get_board()[start_number][start_letter] = None
-                        self._board.get_board()[end_number][end_letter].set_location(end_loc.upper())
-                        if self._which_turn == 'White':
-                            self._which_turn = 'Black'
-                            return True
-                        elif self._which_turn == 'Black':
-                            self._which_turn = 'White'
-                            return True
-                return False
-
-            if start.get_name() == 'Rook':
-                if start.check_move(start_loc, end_loc) is True:
-                    if self._board.check_rook_path(start_loc, end_loc) is True:
-                        self._board.get_board()[end_number][end_letter] = start
-                        self._board.get_board()[start_number][start_letter] = None
-                        self._board.get_board()[end_number][end_letter].set_location(end_loc.upper())
-                        if self._which_turn == 'White':
-                            self._which_turn = 'Black'
-                            return True
-                        elif self._which_turn == 'Black':
-                            self._which_turn = 'White'
-                            return True
-                return False
-
-            if start.get_name() == 'Bishop':
-                if start.check_move(start_loc, end_loc) is True:
-                    if self._board.check_bishop_path(start_loc, end_loc) is True:
-                        self._board.get_board()[end_number][end_letter] = start
-                        self._board.get_board()[start_number][start_letter] = None
-                        self._board.get_board()[end_number][end_letter].set_location(end_loc.upper())
-                        if self._which_turn == 'White':
-                            self._which_turn = 'Black'
-                            return True
-                        elif self._which_turn == 'Black':
-                            self._which_turn = 'White'
-                            return True
-                return False
-
-        if end is not None:  # uses the same general structure as the 'if end is None' branch with some minor changes for taking pieces.
-            if end.get_team() == self._which_turn:
-                return False  # we can't land on a space with our own pieces
-
-            if start.get_name() == 'King' or start.get_name() == 'Knight':
-                if start.check_move(start_loc, end_loc) is True:
-                    self.take_piece(end_loc)  # call the take_piece() method to capture and evaluate for victory conditions
-                    self._board.get_board()[end_number][end_letter] = start
-                    self._board.get_board()[start_number][start_letter] = None
-                    self._board.get_board()[end_number][end_letter].set_location(end_loc.upper())
-                    if self._which_turn == 'White':
-                        self._which_turn = 'Black'
-                        return True
-                    elif self._which_turn == 'Black':
-                        self._which_turn = 'White'
-                        return True
-                return False
-
-            if start.get_name() == 'Pawn':
-                if start.check_move(start_loc, end_loc, True) is True:  # True because we are taking
-                    self.take_piece(end_loc)
-                    self._board.get_board()[end_number][end_letter] = start
-                    self._board.get_board()[start_number][start_letter] = None
-                    self._board.get_board()[end_number][end_letter].set_location(end_loc.upper())
-                    if self._which_turn == 'White':
-                        self._which_turn = 'Black'
-                        return True
-                    elif self._which_turn == 'Black':
-                        self._which_turn = 'White'
-                        return True
-                return False
-
-            if start.get_name() == 'Queen':
-                if start.check_move(start_loc, end_loc) is True:
-                    if self._board.check_bishop_path(start_loc, end_loc) is True or self._board.check_rook_path(start_loc, end_loc) is True:
-                        self.take_piece(end_loc)
-                        self._board.get_board()[end_number][end_letter] = start
-                        self._board.get_board()[start_number][start_letter] = None
-                        self._board.get_board()[end_number][end_letter].set_location(end_loc.upper())
-                        if self._which_turn == 'White':
-                            self._which_turn = 'Black'
-                            return True
-                        elif self._which_turn == 'Black':
-                            self._which_turn = 'White'
-                            return True
-                return False
+        if own >> end_square & 1:
+            return False  # we can't land on a space with our own pieces
+        take = masks[BLACK - self._which_turn] >> end_square & 1 == 1
+        start_number, start_letter = SQUARE_COORDS[start_square]
+        start = self._board.get_board()[start_number][start_letter]  # the GamePiece at the starting position of the board
+        path = start.get_paths(take)[start_square * 64 + end_square]  # Pawns move differently when taking
+        if path is None or path & self._board.get_occupied():
+            return False  # the piece can't move that way, or something is in the path
+        if self._sharers[0] > 1:
+            self._unshare()  # a forked game gets its own board before anything is changed, but only for a legal move
+            start = self._board.get_position(start_square)  # the copy of the piece
+        first_move = start.get_kind() == PAWN and start.get_move()  # _finish_move() clears the Pawn's flag
+        if take:
+            self.take_piece(end_square)  # call the take_piece() method to capture and evaluate for victory conditions
+        return self._finish_move(start, start_square, end_square, first_move)
+
+    def _finish_move(self, start, start_square, end_square, first_move):
+        """
+        moves the already-validated piece start on the board, updates its location and the position hash, then
+        hands the turn to the other team. first_move is the Pawn's flag from before the move. Always returns True
+        """
+        keys = ZOBRIST_PIECES[start.get_side() * 6 + start.get_kind()]
+        self._hash ^= keys[start_square] ^ keys[end_square] ^ ZOBRIST_BLACK_TO_MOVE
+        if first_move is True:
+            self._hash ^= ZOBRIST_FIRST_MOVE[start.get_side()][start_square]  # a Pawn that has moved loses the flag
+            start.set_move(False)
+        self._board.move_piece(start_square, end_square)
+        start.set_location(end_square)
+        self._which_turn = BLACK - self._which_turn  # adjust for next turn
+        return True
+
+    def rejection_reason(self, start_loc, end_loc):
+        """
+        returns why make_move(start_loc, end_loc) would be refused: 'game_over', 'empty_square', 'wrong_turn',
+        'own_piece' (landing on a piece of the same color), 'geometry' (the piece can't move that way) or
+        'obstructed' (something is in the path), or None if the move is legal. The checks run in the same order as
+        make_move() and nothing about the game is changed.
+        """
+        if self._game_state != 'UNFINISHED':
+            return 'game_over'
+        start_square = SQUARES[start_loc]
+        end_square = SQUARES[end_loc]
+        masks = self._board.get_team_masks()
+        own = masks[self._which_turn]
+        if not own >> start_square & 1:
+            return 'wrong_turn' if masks[BLACK - self._which_turn] >> start_square & 1 else 'empty_square'
+        if own >> end_square & 1:
+            return 'own_piece'
+        start = self._board.get_position(start_square)
+        take = masks[BLACK - self._which_turn] >> end_square & 1 == 1
+        path = start.get_paths(take)[start_square * 64 + end_square]  # the same lookup make_move() does
+        if path is None:
+            return 'geometry'
+        return 'obstructed' if path & self._board.get_occupied() else None
+
+    def is_legal(self, start_loc, end_loc):
+        """
+        returns True if make_move(start_loc, end_loc) would be accepted, without changing anything about the game.
+        Answers are cached for the current position, and the cache is dropped as soon as the position hash changes,
+        so asking about the same move again (e.g. while a piece is dragged around) is a dictionary lookup
+        """
+        if self._legal_hash != self._hash:
+            self._legal_hash = self._hash
+            self._legal_cache = {}  # a new dictionary, a forked game may still be using the old one
+        pair = SQUARES[start_loc] * 64 + SQUARES[end_loc]
+        legal = self._legal_cache.get(pair)
+        if legal is None:
+            legal = self._legal_cache[pair] = self.rejection_reason(pair >> 6, pair & 63) is None
+        return legal
+
+    def apply_moves(self, moves):
+        """
+        plays a whole sequence of moves in one call, e.g. from a stored game record. moves is either an iterable of
+        (start, end) pairs (names or square indexes) or a compact string like 'e2e4 e7e5'. Stops at the first
+        illegal move (or unreadable square) and returns a dictionary with the number of moves 'applied', the
+        'failed' index of the move it stopped on (None if every move was played) and the resulting 'game_state'.
+        The rules are exactly those of make_move(), the board and tables are just looked up once for the whole
+        sequence instead of once per move. Like make_move(), nothing is recorded for pop_move().
+        """
+        if isinstance(moves, str):
+            moves = [(move[0:2], move[2:4]) for move in moves.split()]
+        board_object = self._board
+        board = board_object.get_board()
+        masks = board_object.get_team_masks()  # the live list, so it follows every move below
+        move_piece = board_object.move_piece
+        applied = 0
+        for start_loc, end_loc in moves:
+            start_square = SQUARES.get(start_loc)
+            end_square = SQUARES.get(end_loc)
+            if self._game_state != 'UNFINISHED' or start_square is None or end_square is None:
+                break
+            own = masks[self._which_turn]
+            if not own >> start_square & 1 or own >> end_square & 1:
+                break  # an empty space or the wrong color piece, or landing on our own piece
+            take = masks[BLACK - self._which_turn] >> end_square & 1 == 1
+            start_number, start_letter = SQUARE_COORDS[start_square]
+            start = board[start_number][start_letter]
+            path = start.get_paths(take)[start_square * 64 + end_square]
+            if path is None or path & board_object.get_occupied():
+                break
+            if self._sharers[0] > 1:  # a forked game copies everything at its first legal move, see make_move()
+                self._unshare()
+                board_object = self._board
+                board = board_object.get_board()
+                masks = board_object.get_team_masks()
+                move_piece = board_object.move_piece
+                start = board[start_number][start_letter]
+            kind = start.get_kind()
+            first_move = kind == PAWN and start.get_move()
+            if take:
+                self.take_piece(end_square)
+            keys = ZOBRIST_PIECES[self._which_turn * 6 + kind]  # the rest is _finish_move() without the extra calls
+            self._hash ^= keys[start_square] ^ keys[end_square] ^ ZOBRIST_BLACK_TO_MOVE
+            if first_move is True:
+                self._hash ^= ZOBRIST_FIRST_MOVE[self._which_turn][start_square]
+                start.set_move(False)
+            move_piece(start_square, end_square)
+            start.set_location(end_square)
+            self._which_turn = BLACK - self._which_turn
+            applied += 1
+        else:
+            return {'applied': applied, 'failed': None, 'game_state': self._game_state}
+        return {'applied': applied, 'failed': applied, 'game_state': self._game_state}
 
-            if start.get_name() == 'Rook':
-                if start.check_move(start_loc, end_loc) is True:
-                    if self._board.check_rook_path(start_loc, end_loc) is True:
-                        self.take_piece(end_loc)
-                        self._board.get_board()[end_number][end_letter] = start
-                        self._board.get_board()[start_number][start_letter] = None
-                        self._board.get_board()[end_number][end_letter].set_location(end_loc.upper())
-                        if self._which_turn == 'White':
-                            self._which_turn = 'Black'
-                            return True
-                        elif self._which_turn == 'Black':
-                            self._which_turn = 'White'
-                            return True
-                return False
+    def push_move(self, start_loc, end_loc):
+        """
+        makes a move exactly like make_move() but also saves a small undo record so the move can be taken back
+        with pop_move(). Returns True if the move was legal and made, False otherwise (nothing is saved)
+        Moves made with plain make_move() aren't recorded, so don't mix the two while there are moves to undo.
+        """
+        if self._sharers[0] > 1:
+            if self.rejection_reason(start_loc, end_loc) is not None:
+                return False  # a forked game only copies everything for a move it's going to make
+            self._unshare()  # before the record below picks up any pieces
+        start_square = SQUARES[start_loc]
+        end_square = SQUARES[end_loc]
+        start = self._board.get_position(start_square)
+        if start is None:
+            return False
+        record = (start_square, end_square,
+                  self._board.get_position(end_square),  # the piece that will be captured, if any
+                  start.get_move() if start.get_kind() == PAWN else None,
+                  self._game_state, len(self._white_taken), len(self._black_taken), self._hash)
+        if self.make_move(start_square, end_square) is not True:
+            return False
+        self._history.append(record)
+        return True
 
-            if start.get_name() == 'Bishop':
-                if start.check_move(start_loc, end_loc) is True:
-                    if self._board.check_bishop_path(start_loc, end_loc) is True:
-                        self.take_piece(end_loc)
-                        self._board.get_board()[end_number][end_letter] = start
-                        self._board.get_board()[start_number][start_letter] = None
-                        self._board.get_board()[end_number][end_letter].set_location(end_loc.upper())
-                        if self._which_turn == 'White':
-                            self._which_turn = 'Black'
-                            return True
-                        elif self._which_turn == 'Black':
-                            self._which_turn = 'White'
-                            return True
-                return False
+    def pop_move(self):
+        """
+        takes back the last move made with push_move(), putting the moved piece, any captured piece, the Pawn
+        first_move flag, the game state, the turn, the position hash and the capture lists back the way they were.
+        Returns False if there is nothing to undo.
+        """
+        if not self._history:
+            return False
+        if self._sharers[0] > 1:
+            self._unshare()
+        start_square, end_square, captured, first_move, game_state, white_count, black_count, position_hash = \
+            self._history.pop()
+        piece = self._board.get_position(end_square)
+        self._board.move_piece(end_square, start_square)
+        piece.set_location(start_square)
+        if captured is not None:
+            self._board.place_piece(end_square, captured)
+        if first_move is not None:
+            piece.set_move(first_move)
+        self._game_state = game_state
+        self._hash = position_hash
+        self._which_turn = piece.get_side()  # whoever moved gets their turn back
+        if captured is not None:
+            self._capture_counts[self._which_turn][captured.get_kind()] -= 1
+        del self._white_taken[white_count:]
+        del self._black_taken[black_count:]
+        del self._white_captures[white_count:]
+        del self._black_captures[black_count:]
+        return True
+
+    def place_piece(self, location, piece):
+        """
+        puts piece (any GamePiece, e.g. one made from a register_piece() class, or None to clear the space) down on
+        location, replacing whatever was there. For setting up event positions before play, nothing is captured and
+        the turn doesn't change. The position hash is kept up to date
+        """
+        if self._sharers[0] > 1:
+            self._unshare()
+        square = SQUARES[location]
+        for other in (self._board.get_position(square), piece):
+            if other is not None:
+                self._hash ^= ZOBRIST_PIECES[other.get_side() * 6 + other.get_kind()][square]
+                if other.get_kind() == PAWN and other.get_move():
+                    self._hash ^= ZOBRIST_FIRST_MOVE[other.get_side()][square]
+        if piece is not None:
+            piece.set_location(square)
+        self._board.place_piece(square, piece)
 
     def take_piece(self, end_loc):
         """
-        adds value found at location (end_loc) of self._board to the appropriate team 'taken' repository and combs
-        said repositories at the time of deposit to determine if the game victory conditions have been met.
+        adds value found at location (end_loc) of self._board to the appropriate team 'taken' repository, bumps that
+        team's counter for the captured piece type and checks the counter against CAPTURES_TO_WIN to determine if
+        the game victory conditions have been met.
         """
-        end_letter = self._letters[end_loc[0].upper()]  # take_piece only deals with the end location of a move
-        end_number = int(end_loc[1])
-        end = self._board.get_board()[end_number][end_letter]
-
-        if self._which_turn == 'White':
+        if self._sharers[0] > 1:
+            self._unshare()
+        end_square = SQUARES[end_loc]  # take_piece only deals with the end location of a move
+        end = self._board.get_position(end_square)
+        kind = end.get_kind()
+        counts = self._capture_counts[self._which_turn]
+        capture_keys = ZOBRIST_CAPTURES[self._which_turn * 6 + kind]
+        self._hash ^= ZOBRIST_PIECES[end.get_side() * 6 + kind][end_square] ^ capture_keys[counts[kind]]
+        if kind == PAWN and end.get_move():
+            self._hash ^= ZOBRIST_FIRST_MOVE[end.get_side()][end_square]
+        counts[kind] += 1
+        self._hash ^= capture_keys[counts[kind]]
+
+        if self._which_turn == WHITE:
             self._white_taken.append(end)  # pop the pieces in the taken repository
-            pawns = []  # sub-lists used for some logic operations
-            doubles = []
-            knights = []
-            rooks = []
-            bishops = []
-            for piece in self._white_taken:
-                if piece.get_name() == 'Pawn':
-                    pawns.append(piece)
-                    if len(pawns) == 8:  # capturing all 8 pawns wins the game.
-                        self._game_state = 'WHITE_WON'  # ends game
-                if piece.get_name() == 'Rook':
-                    rooks.append(piece)
-                if piece.get_name() == 'Bishop':
-                    bishops.append(piece)
-                if piece.get_name() == 'Knight':
-                    knights.append(piece)
-                if len(bishops) == 2 or len(rooks) == 2 or len(knights) == 2: # capture two of the paired pieces wins the game
-                    self._game_state = 'WHITE_WON'
-                elif piece.get_name() == 'King' or piece.get_name() == 'Queen':
-                    self._game_state = 'WHITE_WON'
-
-        if self._which_turn == 'Black':  # same as previous block, but for the black taken pieces
+            self._white_captures.append(end.get_shorthand())
+            if counts[kind] >= CAPTURE_LIMITS[kind]:  # two Rooks, two Bishops, two Knights, the King, the Queen or all 8 Pawns
+                self._game_state = 'WHITE_WON'  # ends game
+
+        if self._which_turn == BLACK:  # same as previous block, but for the black taken pieces
             self._black_taken.append(end)
-            pawns = []
-            knights = []
-            rooks = []
-            bishops = []
-            for piece in self._black_taken:
-                if piece.get_name() == 'Pawn':
-                    pawns.append(piece)
-                    if len(pawns) == 8:
-                        self._game_state = 'BLACK_WON'
-                if piece.get_name() == 'Rook':
-                    rooks.append(piece)
-                if piece.get_name() == 'Bishop':
-                    bishops.append(piece)
-                if piece.get_name() == 'Knight':
-                    knights.append(piece)
-                if len(bishops) == 2 or len(rooks) == 2 or len(knights) == 2: # capture two of the paired pieces wins the game
-                    self._game_state = 'BLACK_WON'
-                elif piece.get_name() == 'King' or piece.get_name() == 'Queen':
-                    self._game_state = 'BLACK_WON'
+            self._black_captures.append(end.get_shorthand())
+            if counts[kind] >= CAPTURE_LIMITS[kind]:
+                self._game_state = 'BLACK_WON'
+
+    def to_text(self):
+        """
+        returns the position as one line of FEN-like text. The starting position is
+        'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w a2b2c2d2e2f2g2h2a7b7c7d7e7f7g7h7 000000/000000'
+        The fields are the board from row 8 down to row 1 (uppercase is white, lowercase is black, digits count
+        empty spaces), the side to move, the Pawns that still have their first move ('-' if none) and white's then
+        black's capture tallies in P N B R Q K order. The game state follows from the tallies. Raises ValueError for a
+        game with register_piece() pieces on the board, which the format has no letters for
+        """
+        board = self._board.get_board()
+        rows = []
+        unmoved = []
+        for number in range(8, 0, -1):
+            row = ''
+            empty = 0
+            for letter in range(1, 9):
+                piece = board[number][letter]
+                if piece is None:
+                    empty += 1
+                    continue
+                if type(piece) is not PIECE_CLASSES[piece.get_kind()]:
+                    raise ValueError('to_text() only writes the standard pieces: ' + piece.get_name())
+                if empty:
+                    row += str(empty)
+                    empty = 0
+                shorthand = PIECE_LETTERS[piece.get_kind()]
+                row += shorthand if piece.get_side() == WHITE else shorthand.lower()
+                if piece.get_kind() == PAWN and piece.get_move():
+                    unmoved.append(piece.get_location().lower())
+            if empty:
+                row += str(empty)
+            rows.append(row)
+        unmoved.sort(key=lambda name: SQUARES[name])
+        tallies = '/'.join(''.join(str(count) for count in counts) for counts in self._capture_counts)
+        return ' '.join(('/'.join(rows), 'wb'[self._which_turn], ''.join(unmoved) or '-', tallies))
+
+    @classmethod
+    def from_text(cls, text, bitboard=False):
+        """builds a new game from a to_text() line. Raises ValueError if the text isn't a valid position"""
+        fields = text.split()
+        if len(fields) != 4 or fields[1] not in ('w', 'b'):
+            raise ValueError('expected board, side to move, unmoved Pawns and tallies: ' + text)
+        rows = fields[0].split('/')
+        if len(rows) != 8:
+            raise ValueError('expected 8 rows: ' + fields[0])
+        pieces = []
+        for number, row in zip(range(8, 0, -1), rows):
+            letter = 1
+            for char in row:
+                if char in '12345678':
+                    letter += int(char)
+                    continue
+                if char.upper() not in PIECE_LETTERS or letter > 8:
+                    raise ValueError('bad row: ' + row)
+                pieces.append((square_index(number, letter), WHITE if char.isupper() else BLACK,
+                               PIECE_LETTERS.index(char.upper()), False))
+                letter += 1
+            if letter != 9:
+                raise ValueError('row does not cover 8 spaces: ' + row)
+
+        flags = fields[2] if fields[2] != '-' else ''
+        unmoved = {SQUARES.get(flags[place:place + 2]) for place in range(0, len(flags), 2)}
+        pawn_squares = {piece[0] for piece in pieces if piece[2] == PAWN}
+        if len(flags) % 2 or not unmoved <= pawn_squares:
+            raise ValueError('unmoved Pawn list names a space without a Pawn: ' + fields[2])
+        pieces = [(square, side, kind, square in unmoved) for square, side, kind, first_move in pieces]
+
+        tallies = fields[3].split('/')
+        if len(tallies) != 2 or any(len(counts) != 6 or not counts.isdigit() for counts in tallies):
+            raise ValueError('expected two sets of six capture tallies: ' + fields[3])
+        return cls._load(pieces, 'wb'.index(fields[1]), [[int(count) for count in counts] for counts in tallies],
+                         bitboard)
+
+    def to_bytes(self):
+        """
+        returns the position as a SNAPSHOT_SIZE (39) byte snapshot. Bytes 0-31 hold one 4 bit code per square
+        (square index 2n in the low half of byte n): 0 is empty, 1-6 are white P N B R Q K, 7-12 black, and 13/14
+        a white/black Pawn that still has its first move. Byte 32 is the team code to move and bytes 33-38 the
+        capture tallies for each piece type code, white in the low half and black in the high half. Like to_text(),
+        raises ValueError for a game with register_piece() pieces on the board
+        """
+        board = self._board.get_board()
+        data = bytearray(SNAPSHOT_SIZE)
+        for square in range(64):
+            number, letter = SQUARE_COORDS[square]
+            piece = board[number][letter]
+            if piece is not None:
+                if type(piece) is not PIECE_CLASSES[piece.get_kind()]:
+                    raise ValueError('to_bytes() only writes the standard pieces: ' + piece.get_name())
+                if piece.get_kind() == PAWN and piece.get_move():
+                    code = UNMOVED_PAWN_CODES[piece.get_side()]
+                else:
+                    code = piece.get_side() * 6 + piece.get_kind() + 1
+                data[square >> 1] |= code << (square & 1) * 4
+        data[32] = self._which_turn
+        white_counts, black_counts = self._capture_counts
+        for kind in range(6):
+            data[33 + kind] = white_counts[kind] | black_counts[kind] << 4
+        return bytes(data)
+
+    @classmethod
+    def from_bytes(cls, data, bitboard=False):
+        """builds a new game from a to_bytes() snapshot. Raises ValueError if data isn't a valid snapshot"""
+        if len(data) != SNAPSHOT_SIZE or data[32] not in (WHITE, BLACK):
+            raise ValueError('not a ChessVar snapshot')
+        pieces = []
+        for square in range(64):
+            code = data[square >> 1] >> (square & 1) * 4 & 15
+            if code == 0:
+                continue
+            if code > 14:
+                raise ValueError('bad square code in snapshot')
+            if code in UNMOVED_PAWN_CODES:
+                pieces.append((square, code - UNMOVED_PAWN_CODES[WHITE], PAWN, True))
+            else:
+                pieces.append((square, (code - 1) // 6, (code - 1) % 6, False))
+        tallies = [[data[33 + kind] & 15 for kind in range(6)], [data[33 + kind] >> 4 for kind in range(6)]]
+        return cls._load(pieces, data[32], tallies, bitboard)
+
+    def compact(self):
+        """
+        returns the game packed into a CompactGame, a few dozen bytes instead of a board of lists and 32 piece
+        objects, for keeping idle games around. CompactGame.expand() gives back a ChessVar. Like to_bytes(), the
+        capture lists come back in piece type order. Raises ValueError for a game with register_piece() pieces on
+        the board, since a CompactGame only knows the standard ones
+        """
+        board = self._board.get_board()
+        data = bytearray(COMPACT_SIZE)
+        for square in range(64):
+            number, letter = SQUARE_COORDS[square]
+            piece = board[number][letter]
+            if piece is not None:
+                if type(piece) is not PIECE_CLASSES[piece.get_kind()]:
+                    raise ValueError('a CompactGame only holds the standard pieces: ' + piece.get_name())
+                if piece.get_kind() == PAWN and piece.get_move():
+                    data[square] = UNMOVED_PAWN_CODES[piece.get_side()]
+                else:
+                    data[square] = piece.get_side() * 6 + piece.get_kind() + 1
+        data[COMPACT_TURN] = self._which_turn
+        data[COMPACT_STATE] = GAME_STATES.index(self._game_state)
+        data[COMPACT_COUNTS:COMPACT_COUNTS + 12] = bytes(self._capture_counts[WHITE] + self._capture_counts[BLACK])
+        data[COMPACT_HASH:] = self._hash.to_bytes(8, 'little')
+        return CompactGame(data)
+
+    @classmethod
+    def _load(cls, pieces, turn, tallies, bitboard):
+        """
+        builds a game from decoded position data: pieces is a list of (square index, team code, piece type code,
+        first_move) and tallies the capture counts by team code and piece type code. The board starts out empty,
+        so the default ChessBoard is never built. The capture lists are rebuilt from the tallies in piece type order,
+        since neither format keeps the order the captures were made in.
+        """
+        for counts in tallies:
+            if any(count > CAPTURE_LIMITS[kind] for kind, count in enumerate(counts)):
+                raise ValueError('capture tally past the winning count')
+        game = cls(bitboard, populate=False)
+        board = game._board
+        position_hash = ZOBRIST_BLACK_TO_MOVE if turn == BLACK else 0  # built up as we go, like _compute_hash()
+        for square, side, kind, first_move in pieces:
+            piece = PIECE_CLASSES[kind](TEAM_NAMES[side], square)
+            position_hash ^= ZOBRIST_PIECES[side * 6 + kind][square]
+            if kind == PAWN:
+                piece.set_move(first_move)
+                if first_move:
+                    position_hash ^= ZOBRIST_FIRST_MOVE[side][square]
+            board.place_piece(square, piece)
+
+        game._which_turn = turn
+        game._capture_counts = tallies
+        for side, taken, captures, state in ((WHITE, game._white_taken, game._white_captures, 'WHITE_WON'),
+                                             (BLACK, game._black_taken, game._black_captures, 'BLACK_WON')):
+            for kind, count in enumerate(tallies[side]):
+                for capture in range(count):
+                    piece = PIECE_CLASSES[kind](TEAM_NAMES[BLACK - side], 0)
+                    piece.set_location(None)  # captured pieces aren't on the board
+                    taken.append(piece)
+                    captures.append(piece.get_shorthand())
+                if count >= CAPTURE_LIMITS[kind]:
+                    game._game_state = state
+                position_hash ^= ZOBRIST_CAPTURES[side * 6 + kind][count]
+        game._hash = position_hash
+        return game
 
     def reset_game(self):
         """resets all data members to default status so the game may be played again."""
+        self._sharers[0] -= 1  # everything below is new, so a forked game doesn't need to copy anything
+        self._sharers = [1]
         self._board = None
         self._game_state = 'UNFINISHED'
         self._black_taken = []
         self._white_taken = []
-        self._which_turn = 'White'
-        self._board = ChessBoard()
+        self._white_captures = []
+        self._black_captures = []
+        self._capture_counts = [[0] * 6, [0] * 6]
+        self._which_turn = WHITE
+        self._board = BitBoard() if self._bitboard else ChessBoard()
+        self._history = []
+        self._hash = self._compute_hash()
+        self._attacks = None
+        self._team_attacks = [0, 0]
+
+
+class CompactGame:
+    """
+    represents a game packed into one COMPACT_SIZE (86) byte bytearray, for keeping idle games (e.g. correspondence
+    play) in memory: a ChessVar is a board of lists, 32 piece objects and several lists, a CompactGame is one small
+    object. Bytes 0-63 hold a code per square index (0 empty, 1-12 team code * 6 + piece type code + 1, 13/14 a
+    white/black Pawn that still has its first move), then the team code to move, the game state, the capture counts
+    and the position hash. make_move() and the get_() methods work on the bytes directly, with exactly the rules of
+    ChessVar; anything else goes through expand(), which builds a full ChessVar only when a caller needs one.
+    """
+
+    __slots__ = ('_data',)
+
+    def __init__(self, data=None):
+        """data is a get_data() (or ChessVar.compact()) byte string, or None for the starting position"""
+        if data is None:
+            data = START_COMPACT
+        if len(data) != COMPACT_SIZE:
+            raise ValueError('not a CompactGame')
+        self._data = bytearray(data)
+
+    def get_data(self):
+        """returns the packed game as bytes, e.g. for storing it"""
+        return bytes(self._data)
+
+    def get_game_state(self):
+        """returns the game state, e.g. 'UNFINISHED'"""
+        return GAME_STATES[self._data[COMPACT_STATE]]
+
+    def get_turn(self):
+        """returns the team ('White' or 'Black') whose turn it is"""
+        return TEAM_NAMES[self._data[COMPACT_TURN]]
+
+    def get_hash(self):
+        """returns the position hash, the same one ChessVar.get_hash() gives"""
+        return int.from_bytes(self._data[COMPACT_HASH:], 'little')
+
+    def get_capture_counts(self, team):
+        """returns a dictionary of how many pieces of each type the given team has captured, e.g. {'Pawn': 3, ...}"""
+        first = COMPACT_COUNTS + TEAM_CODES[team] * 6
+        return dict(zip(PIECE_NAMES, self._data[first:first + 6]))
+
+    def make_move(self, start_loc, end_loc):
+        """
+        makes the move on the packed game if it's legal, by the same move tables ChessVar.make_move() uses, and
+        returns True, otherwise False. Captures, victory and the position hash are all kept up to date in place
+        """
+        data = self._data
+        if data[COMPACT_STATE]:
+            return False  # the game is over
+        start = SQUARES[start_loc]
+        end = SQUARES[end_loc]
+        turn = data[COMPACT_TURN]
+        code = data[start]
+        target = data[end]
+        if code == 0:
+            return False
+        side, kind, first_move = COMPACT_PIECES[code]
+        if side != turn or (target and COMPACT_PIECES[target][0] == turn):
+            return False  # the wrong color piece, or landing on our own piece
+        if kind == PAWN:
+            path = PAWN_PATHS[target != 0][side][first_move][start * 64 + end]
+        else:
+            path = PIECE_PATHS[kind][start * 64 + end]
+        if path is None:
+            return False
+        while path:  # at most six squares to look at, so no occupancy mask is kept
+            if data[(path & -path).bit_length() - 1]:
+                return False
+            path &= path - 1
+
+        position_hash = int.from_bytes(data[COMPACT_HASH:], 'little')
+        if target:  # what ChessVar.take_piece() does
+            other, taken, taken_first = COMPACT_PIECES[target]
+            position_hash ^= ZOBRIST_PIECES[other * 6 + taken][end]
+            if taken_first:
+                position_hash ^= ZOBRIST_FIRST_MOVE[other][end]
+            slot = COMPACT_COUNTS + turn * 6 + taken
+            keys = ZOBRIST_CAPTURES[turn * 6 + taken]
+            position_hash ^= keys[data[slot]] ^ keys[data[slot] + 1]
+            data[slot] += 1
+            if data[slot] >= CAPTURE_LIMITS[taken]:
+                data[COMPACT_STATE] = turn + 1  # 'WHITE_WON' or 'BLACK_WON'
+        keys = ZOBRIST_PIECES[side * 6 + kind]  # and what _finish_move() does
+        position_hash ^= keys[start] ^ keys[end] ^ ZOBRIST_BLACK_TO_MOVE
+        if first_move:
+            position_hash ^= ZOBRIST_FIRST_MOVE[side][start]
+            code = side * 6 + PAWN + 1
+        data[end] = code
+        data[start] = 0
+        data[COMPACT_TURN] = BLACK - turn
+        data[COMPACT_HASH:] = position_hash.to_bytes(8, 'little')
+        return True
+
+    def to_bytes(self):
+        """returns the same SNAPSHOT_SIZE byte snapshot ChessVar.to_bytes() would, without expanding the game"""
+        data = self._data
+        snapshot = bytearray(SNAPSHOT_SIZE)
+        for square in range(0, 64, 2):
+            snapshot[square >> 1] = data[square] | data[square + 1] << 4
+        snapshot[32] = data[COMPACT_TURN]
+        for kind in range(6):
+            snapshot[33 + kind] = data[COMPACT_COUNTS + kind] | data[COMPACT_COUNTS + 6 + kind] << 4
+        return bytes(snapshot)
+
+    def expand(self, bitboard=False):
+        """returns a full ChessVar in this position, see ChessVar.compact()"""
+        data = self._data
+        pieces = [(square,) + COMPACT_PIECES[data[square]] for square in range(64) if data[square]]
+        tallies = [list(data[COMPACT_COUNTS:COMPACT_COUNTS + 6]), list(data[COMPACT_COUNTS + 6:COMPACT_COUNTS + 12])]
+        return ChessVar._load(pieces, data[COMPACT_TURN], tallies, bitboard)
+
+
+START_COMPACT = ChessVar().compact().get_data()  # CompactGame() copies this
 
 
 def main():
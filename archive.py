@@ -0,0 +1,309 @@
+# Description: Append-only archive of finished ChessVar games, read through mmap. An archive at PATH is four files:
+#                PATH            the games themselves: a short header, then per game one byte of final game state,
+#                                two bytes of move count and two bytes (start, end square index) per move
+#                PATH.games      one fixed-size record per game: where it starts in PATH, its final position hash,
+#                                final game state and length, so games can be filtered without reading any moves
+#                PATH.positions  (position hash, game number) for every distinct position each game reached, in the
+#                                order the games were added
+#                PATH.index      the same pairs sorted by hash, written by build_index(), for binary searching.
+#                                The sort runs on fixed-size chunks that are merged afterwards, so building the
+#                                index takes the same memory for a thousand games as for tens of millions
+#              Queries like "every game that reached this position" binary search the index (plus a scan of any
+#              positions added since it was built) instead of replaying every game.
+#
+#              python archive.py import results.jsonl games.bin   # selfplay.py --moves output, or one game per line
+#              python archive.py index games.bin
+#              python archive.py query games.bin --state WHITE_WON --moves "e2e4 e7e5"
+
+import argparse
+import heapq
+import json
+import mmap
+import os
+import struct
+import sys
+
+from ChessVar import GAME_STATES, ChessVar, SQUARE_NAMES, SQUARES
+
+
+MAGIC = b'CVARCH1\n'  # first bytes of every archive file
+GAME_HEADER = struct.Struct('<BH')  # final game state code, number of moves
+GAME_ENTRY = struct.Struct('<QQBH')  # offset in PATH, final position hash, final game state code, number of moves
+POSITION_ENTRY = struct.Struct('<QI')  # position hash, game number
+INDEX_HEADER = struct.Struct('<Q')  # how many PATH.positions entries the index covers
+INDEX_RUN = 1 << 18  # PATH.positions entries build_index() sorts in memory at a time
+MERGE_BLOCK = 1 << 14  # entries read from each sorted run, and written to the index, at a time
+MAX_MOVES = 0xFFFF  # longest game GAME_HEADER and GAME_ENTRY can record
+
+
+def _map(path):
+    """returns a read-only mmap of path, or empty bytes if the file is empty or missing (mmap can't map 0 bytes)"""
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return b''
+    with open(path, 'rb') as file:
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def position_hash(moves):
+    """returns the ChessVar position hash reached by playing moves (pairs or a 'e2e4 e7e5' string) from the start"""
+    game = ChessVar()
+    result = game.apply_moves(moves)
+    if result['failed'] is not None:
+        raise ValueError('illegal move at index ' + str(result['failed']))
+    return game.get_hash()
+
+
+class ArchiveWriter:
+    """appends games to an archive, creating the files if needed. Use as a context manager or call close()"""
+
+    def __init__(self, path):
+        self._path = path
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._games = open(path, 'ab')
+        if new:
+            self._games.write(MAGIC)
+        self._entries = open(path + '.games', 'ab')
+        self._positions = open(path + '.positions', 'ab')
+        self._count = os.path.getsize(path + '.games') // GAME_ENTRY.size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def add(self, moves):
+        """
+        replays moves (pairs or a 'e2e4 e7e5' string) from the starting position and appends the game. Raises
+        ValueError on an illegal move or a game longer than MAX_MOVES, in which case nothing is written. Returns the
+        new game's number
+        """
+        if isinstance(moves, str):
+            moves = [(move[0:2], move[2:4]) for move in moves.split()]
+        game = ChessVar()
+        squares = bytearray()
+        hashes = {game.get_hash()}
+        for index, (start_loc, end_loc) in enumerate(moves):
+            if start_loc not in SQUARES or end_loc not in SQUARES or game.make_move(start_loc, end_loc) is not True:
+                raise ValueError('illegal move at index ' + str(index))
+            squares.append(SQUARES[start_loc])
+            squares.append(SQUARES[end_loc])
+            hashes.add(game.get_hash())
+        if len(squares) // 2 > MAX_MOVES:
+            raise ValueError('game too long to archive: ' + str(len(squares) // 2) + ' moves')
+
+        number = self._count
+        state = GAME_STATES.index(game.get_game_state())
+        offset = self._games.tell()
+        self._games.write(GAME_HEADER.pack(state, len(squares) // 2) + squares)
+        self._entries.write(GAME_ENTRY.pack(offset, game.get_hash(), state, len(squares) // 2))
+        self._positions.write(b''.join(POSITION_ENTRY.pack(key, number) for key in hashes))
+        self._count += 1
+        return number
+
+    def close(self):
+        """flushes and closes the archive files"""
+        for file in (self._games, self._entries, self._positions):
+            file.close()
+
+
+def _read_run(file):
+    """yields the (position hash, game number) entries of a sorted run file, MERGE_BLOCK at a time"""
+    while True:
+        block = file.read(MERGE_BLOCK * POSITION_ENTRY.size)
+        if not block:
+            return
+        yield from POSITION_ENTRY.iter_unpack(block)
+
+
+def build_index(path, run_size=INDEX_RUN):
+    """
+    sorts PATH.positions into PATH.index. Sorting the whole list at once would need every entry in memory as Python
+    objects, so it's an external sort: run_size entries at a time are sorted into temporary run files, which are
+    then merged into the index. Rebuild whenever enough games have been added since the last time
+    """
+    positions = _map(path + '.positions')
+    size = POSITION_ENTRY.size
+    count = len(positions) // size
+    runs = []
+    try:
+        for first in range(0, count, run_size):
+            entries = sorted(POSITION_ENTRY.iter_unpack(positions[first * size:(first + run_size) * size]))
+            runs.append('%s.index.run%d' % (path, len(runs)))
+            with open(runs[-1], 'wb') as file:
+                file.write(b''.join(POSITION_ENTRY.pack(key, number) for key, number in entries))
+            del entries
+        files = [open(run, 'rb') for run in runs]
+        try:
+            with open(path + '.index.tmp', 'wb') as output:
+                output.write(INDEX_HEADER.pack(count))
+                block = []
+                for key, number in heapq.merge(*[_read_run(file) for file in files]):
+                    block.append(POSITION_ENTRY.pack(key, number))
+                    if len(block) == MERGE_BLOCK:
+                        output.write(b''.join(block))
+                        block = []
+                output.write(b''.join(block))
+        finally:
+            for file in files:
+                file.close()
+    finally:
+        for run in runs:
+            if os.path.exists(run):
+                os.remove(run)
+    os.replace(path + '.index.tmp', path + '.index')  # readers never see a half-written index
+    return count
+
+
+class ArchiveReader:
+    """read-only view of an archive. Every file is memory-mapped, so opening one costs nothing up front"""
+
+    def __init__(self, path):
+        self._games = _map(path)
+        if self._games[:len(MAGIC)] != MAGIC:
+            raise ValueError('not a ChessVar archive: ' + path)
+        self._entries = _map(path + '.games')
+        self._positions = _map(path + '.positions')
+        self._index = _map(path + '.index')
+        self._indexed = INDEX_HEADER.unpack_from(self._index)[0] if self._index else 0
+
+    def __len__(self):
+        return len(self._entries) // GAME_ENTRY.size
+
+    def get_entry(self, number):
+        """returns (final position hash, final game state, number of moves) for game number"""
+        offset, key, state, length = GAME_ENTRY.unpack_from(self._entries, number * GAME_ENTRY.size)
+        return key, GAME_STATES[state], length
+
+    def get_moves(self, number):
+        """returns game number's moves as a list of ('E2', 'E4') pairs, read straight out of the mapped file"""
+        offset = GAME_ENTRY.unpack_from(self._entries, number * GAME_ENTRY.size)[0]
+        length = GAME_HEADER.unpack_from(self._games, offset)[1]
+        start = offset + GAME_HEADER.size
+        squares = self._games[start:start + length * 2]
+        return [(SQUARE_NAMES[squares[place]], SQUARE_NAMES[squares[place + 1]]) for place in range(0, len(squares), 2)]
+
+    def replay(self, number):
+        """returns a ChessVar with game number played out to its final position"""
+        game = ChessVar()
+        game.apply_moves(self.get_moves(number))
+        return game
+
+    def find(self, game_state=None, min_length=0, max_length=None, final_hash=None):
+        """
+        returns the numbers of the games matching every filter given: the final game state, a range of game
+        lengths (in moves) and the final position hash. Only the fixed-size game entries are read
+        """
+        state = None if game_state is None else GAME_STATES.index(game_state)
+        matches = []
+        for number, (offset, key, code, length) in enumerate(GAME_ENTRY.iter_unpack(self._entries)):
+            if state is not None and code != state:
+                continue
+            if length < min_length or (max_length is not None and length > max_length):
+                continue
+            if final_hash is not None and key != final_hash:
+                continue
+            matches.append(number)
+        return matches
+
+    def games_reaching(self, key):
+        """
+        returns the sorted numbers of every game that passed through the position with hash key. Binary searches
+        the index, then scans whatever positions were appended after the index was built
+        """
+        size = POSITION_ENTRY.size
+        low, high = 0, self._indexed
+        while low < high:  # leftmost entry with this hash
+            middle = (low + high) // 2
+            if POSITION_ENTRY.unpack_from(self._index, INDEX_HEADER.size + middle * size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        numbers = []
+        while low < self._indexed:
+            found, number = POSITION_ENTRY.unpack_from(self._index, INDEX_HEADER.size + low * size)
+            if found != key:
+                break
+            numbers.append(number)
+            low += 1
+        tail = memoryview(self._positions)[self._indexed * size:] if self._positions else b''
+        numbers.extend(number for found, number in POSITION_ENTRY.iter_unpack(tail) if found == key)
+        return sorted(numbers)
+
+    def get_stats(self):
+        """returns the number of games, results by game state and how much of the position list is indexed"""
+        results = dict.fromkeys(GAME_STATES, 0)
+        for offset, key, code, length in GAME_ENTRY.iter_unpack(self._entries):
+            results[GAME_STATES[code]] += 1
+        return {'games': len(self), 'results': results, 'positions': len(self._positions) // POSITION_ENTRY.size,
+                'indexed': self._indexed}
+
+
+def read_records(source):
+    """
+    yields the move strings in a file of selfplay.py JSON lines (with --moves) or of one move string per line. Blank
+    lines and JSON lines without moves come out as empty strings
+    """
+    with open(source) as file:
+        for line in file:
+            line = line.strip()
+            if line.startswith('{'):
+                line = json.loads(line).get('moves', '')
+            yield line
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Store and search finished ChessVar games.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    add = commands.add_parser('import', help='append games from a selfplay.py --moves file or a file of move strings')
+    add.add_argument('source')
+    add.add_argument('archive')
+    add.add_argument('--no-index', action='store_true', help="don't rebuild the position index afterwards")
+    index = commands.add_parser('index', help='rebuild the position index')
+    index.add_argument('archive')
+    query = commands.add_parser('query', help='print the numbers of matching games')
+    query.add_argument('archive')
+    query.add_argument('--state', choices=GAME_STATES)
+    query.add_argument('--min-length', type=int, default=0)
+    query.add_argument('--max-length', type=int)
+    query.add_argument('--moves', help='only games that reached the position after these moves, e.g. "e2e4 e7e5"')
+    query.add_argument('--show', action='store_true', help='print each game\'s moves too')
+    stats = commands.add_parser('stats', help='print archive totals')
+    stats.add_argument('archive')
+    args = parser.parse_args(argv)
+
+    if args.command == 'import':
+        added = skipped = 0
+        with ArchiveWriter(args.archive) as writer:
+            for moves in read_records(args.source):
+                if not moves:
+                    skipped += 1  # a blank line or a game saved without --moves, not a game with no moves
+                    continue
+                try:
+                    writer.add(moves)
+                    added += 1
+                except ValueError:
+                    skipped += 1
+        if not args.no_index:
+            build_index(args.archive)
+        print(json.dumps({'added': added, 'skipped': skipped}))
+    elif args.command == 'index':
+        print(json.dumps({'indexed': build_index(args.archive)}))
+    elif args.command == 'stats':
+        print(json.dumps(ArchiveReader(args.archive).get_stats()))
+    else:
+        reader = ArchiveReader(args.archive)
+        numbers = reader.find(args.state, args.min_length, args.max_length)
+        if args.moves is not None:
+            reaching = set(reader.games_reaching(position_hash(args.moves)))
+            numbers = [number for number in numbers if number in reaching]
+        for number in numbers:
+            if args.show:
+                print(number, ' '.join((start + end).lower() for start, end in reader.get_moves(number)))
+            else:
+                print(number)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
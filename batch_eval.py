@@ -0,0 +1,226 @@
+# Description: NumPy batch evaluation for ChessVar positions. A PositionBatch holds N positions as arrays (an N x 64
+#              int8 array of square codes, the side to move and the capture tallies) and works out features for all of
+#              them at once with array operations: material on the board, progress toward each capture set, the
+#              engine.py evaluation, game states and legal-move masks. No ChessVar objects are touched after loading.
+#
+#              Square codes are the ones in ChessVar.to_bytes() snapshots: 0 empty, 1-6 white P N B R Q K, 7-12 black,
+#              13/14 a white/black Pawn that still has its first move. A file of snapshots back to back loads straight
+#              into a batch without building any games.
+#
+#              Needs NumPy (pip install numpy).
+#
+#              python batch_eval.py snapshots.bin          # SNAPSHOT_SIZE byte snapshots back to back
+#              python batch_eval.py positions.txt --text   # one ChessVar.to_text() line per position
+
+import argparse
+import json
+import sys
+
+import numpy as np
+
+from ChessVar import (BISHOP, BISHOP_BETWEEN, BLACK, CAPTURE_LIMITS, GAME_STATES, KING, KING_STEPS, KNIGHT,
+                      KNIGHT_JUMPS, PAWN, QUEEN, ROOK, ROOK_BETWEEN, SNAPSHOT_SIZE, SQUARE_COORDS, UNMOVED_PAWN_CODES,
+                      WHITE, ChessVar)
+from engine import PROGRESS_SCALE
+
+
+CODE_COUNT = 15  # square codes 0-14
+CODE_SIDES = np.array([-1] + [WHITE] * 6 + [BLACK] * 6 + [WHITE, BLACK], dtype=np.int8)  # square code -> team code
+CODE_KINDS = np.array([-1] + list(range(6)) * 2 + [PAWN, PAWN], dtype=np.int8)  # square code -> piece type code
+LIMITS = np.array(CAPTURE_LIMITS, dtype=np.float64)
+
+
+def _build_move_tables():
+    """
+    builds the per-square-code move tables, each CODE_COUNT x 64 x 64 bools indexed [code, start, end]: QUIET says
+    the piece may move from start to an empty end, CAPTURE that it may take a piece on end, and SLIDES which codes
+    need a clear path. They are the same rules as ChessVar._piece_targets(), Pawn quirks included
+    """
+    quiet = np.zeros((CODE_COUNT, 64, 64), dtype=bool)
+    capture = np.zeros((CODE_COUNT, 64, 64), dtype=bool)
+    slides = np.zeros(CODE_COUNT, dtype=bool)
+    for code in range(1, CODE_COUNT):
+        side, kind = int(CODE_SIDES[code]), int(CODE_KINDS[code])
+        for start in range(64):
+            number, letter = SQUARE_COORDS[start]
+            for end in range(64):
+                end_number, end_letter = SQUARE_COORDS[end]
+                pair = start * 64 + end
+                if kind == PAWN:
+                    unmoved = code in UNMOVED_PAWN_CODES
+                    if side == WHITE:
+                        low, high = number, (4 if unmoved else number + 1)
+                    else:
+                        low, high = (5 if unmoved else number - 1), number
+                    if low <= end_number <= high:
+                        quiet[code, start, end] = end_letter == letter and end_number != number  # no path check
+                        capture[code, start, end] = abs(end_letter - letter) == 1  # sideways captures too
+                    continue
+                if kind == KNIGHT:
+                    reach = end in KNIGHT_JUMPS[start]
+                elif kind == KING:
+                    reach = end in KING_STEPS[start]
+                elif kind == ROOK:
+                    reach = ROOK_BETWEEN[pair] is not None and start != end
+                elif kind == BISHOP:
+                    reach = BISHOP_BETWEEN[pair] is not None and start != end
+                else:
+                    reach = (ROOK_BETWEEN[pair] is not None or BISHOP_BETWEEN[pair] is not None) and start != end
+                quiet[code, start, end] = capture[code, start, end] = reach
+        slides[code] = kind in (ROOK, BISHOP, QUEEN)
+    return quiet, capture, slides
+
+
+def _build_between_masks():
+    """returns 4096 uint64 masks: entry start * 64 + end has a bit set for each square strictly between the two"""
+    between = np.zeros(4096, dtype=np.uint64)
+    for pair in range(4096):
+        mask = ROOK_BETWEEN[pair] if ROOK_BETWEEN[pair] is not None else BISHOP_BETWEEN[pair]
+        between[pair] = mask or 0
+    return between
+
+
+QUIET_MOVES, CAPTURE_MOVES, SLIDES = _build_move_tables()
+BETWEEN = _build_between_masks()
+
+
+class PositionBatch:
+    """
+    represents N positions as arrays: codes (N x 64 int8 square codes, indexed by square index), turn (N team codes
+    of the side to move) and tallies (N x 2 x 6 capture counts by team code and piece type code). Every method works
+    on the whole batch at once and returns arrays with the batch as their first axis.
+    """
+
+    def __init__(self, codes, turn, tallies):
+        self._codes = np.asarray(codes, dtype=np.int8).reshape(-1, 64)
+        self._turn = np.asarray(turn, dtype=np.int8).reshape(-1)
+        self._tallies = np.asarray(tallies, dtype=np.int8).reshape(-1, 2, 6)
+
+    @classmethod
+    def from_snapshots(cls, data):
+        """builds a batch from ChessVar.to_bytes() snapshots, given as one bytes object or a list of them"""
+        if not isinstance(data, (bytes, bytearray, memoryview)):
+            data = b''.join(data)
+        raw = np.frombuffer(data, dtype=np.uint8)
+        if raw.size % SNAPSHOT_SIZE:
+            raise ValueError('data is not a whole number of snapshots')
+        raw = raw.reshape(-1, SNAPSHOT_SIZE)
+        codes = np.empty((raw.shape[0], 64), dtype=np.int8)
+        codes[:, 0::2] = raw[:, :32] & 15  # even squares in the low half of each byte
+        codes[:, 1::2] = raw[:, :32] >> 4
+        if (codes >= CODE_COUNT).any():
+            raise ValueError('bad square code in snapshot')
+        tallies = np.stack([raw[:, 33:39] & 15, raw[:, 33:39] >> 4], axis=1)
+        return cls(codes, raw[:, 32], tallies)
+
+    @classmethod
+    def from_games(cls, games):
+        """
+        builds a batch from ChessVar games (one to_bytes() call each, so a game with register_piece() pieces raises
+        ValueError)
+        """
+        return cls.from_snapshots([game.to_bytes() for game in games])
+
+    def __len__(self):
+        return self._codes.shape[0]
+
+    def get_codes(self):
+        """returns the N x 64 square codes"""
+        return self._codes
+
+    def get_turn(self):
+        """returns the N team codes of the side to move"""
+        return self._turn
+
+    def get_tallies(self):
+        """returns the N x 2 x 6 capture tallies"""
+        return self._tallies
+
+    def material(self):
+        """returns N x 2 x 6 counts of the pieces still on the board, by team code and piece type code"""
+        counts = np.zeros((len(self), CODE_COUNT), dtype=np.int16)
+        for code in range(1, CODE_COUNT):
+            counts[:, code] = (self._codes == code).sum(axis=1)
+        material = np.zeros((len(self), 2, 6), dtype=np.int16)
+        np.add.at(material, (slice(None), CODE_SIDES[1:], CODE_KINDS[1:]), counts[:, 1:])
+        return material
+
+    def capture_progress(self):
+        """returns N x 2 x 6 progress (0.0 to 1.0) toward each capture set, squared like engine.set_progress()"""
+        return (self._tallies / LIMITS) ** 2
+
+    def evaluate(self):
+        """returns the engine.evaluate() score of every position, from the side to move's point of view"""
+        progress = self.capture_progress()
+        scores = PROGRESS_SCALE * (progress.max(axis=2) + progress.sum(axis=2) / 4)
+        white_ahead = scores[:, WHITE] - scores[:, BLACK]
+        return np.trunc(np.where(self._turn == WHITE, white_ahead, -white_ahead)).astype(np.int64)
+
+    def game_states(self):
+        """returns N game state codes, indexes into GAME_STATES: 0 unfinished, 1 white won, 2 black won"""
+        finished = (self._tallies >= LIMITS).any(axis=2)
+        return np.where(finished[:, WHITE], 1, np.where(finished[:, BLACK], 2, 0)).astype(np.int8)
+
+    def legal_move_mask(self):
+        """
+        returns an N x 64 x 64 bool array, True at [n, start, end] when that move is legal in position n. Finished
+        games have no legal moves. Peaks at about 10 KB per position (the 4 KB result, one table lookup of the same
+        size and the sliders' path masks), so split very large batches into chunks
+        """
+        sides = CODE_SIDES[self._codes]
+        occupied = self._codes != 0
+        own = occupied & (sides == self._turn[:, None])
+        enemy = occupied & ~own
+        squares = np.arange(64)  # pairs each square's code with that square's row of the move tables
+        moves = QUIET_MOVES[self._codes, squares]
+        moves &= ~occupied[:, None, :]
+        captures = CAPTURE_MOVES[self._codes, squares]
+        captures &= enemy[:, None, :]
+        moves |= captures
+        del captures
+        moves &= own[:, :, None]
+        positions, starts = np.nonzero(own & SLIDES[self._codes])
+        if positions.size:  # only the sliders' rows need a path check, against the board packed into one uint64
+            boards = np.packbits(occupied, axis=1, bitorder='little').view('<u8').reshape(-1)
+            between = BETWEEN[starts[:, None] * 64 + squares]
+            moves[positions, starts] &= (between & boards[positions][:, None]) == 0
+        moves &= (self.game_states() == 0)[:, None, None]
+        return moves
+
+    def legal_move_counts(self):
+        """returns the number of legal moves in every position. 0 means finished or stuck"""
+        return self.legal_move_mask().sum(axis=(1, 2))
+
+    def features(self):
+        """returns an N x 38 float32 feature matrix: material, capture progress, tallies, side to move, move count"""
+        return np.concatenate([self.material().reshape(-1, 12), self.capture_progress().reshape(-1, 12),
+                               self._tallies.reshape(-1, 12), self._turn[:, None],
+                               self.legal_move_counts()[:, None]], axis=1).astype(np.float32)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Score a file of ChessVar positions in one batch.')
+    parser.add_argument('positions', help='snapshot file, or to_text() lines with --text')
+    parser.add_argument('--text', action='store_true', help='positions are ChessVar.to_text() lines')
+    parser.add_argument('--chunk', type=int, default=4096, help='positions per legal-move batch')
+    args = parser.parse_args(argv)
+
+    if args.text:
+        with open(args.positions) as file:
+            batch = PositionBatch.from_games(ChessVar.from_text(line) for line in file if line.strip())
+    else:
+        with open(args.positions, 'rb') as file:
+            batch = PositionBatch.from_snapshots(file.read())
+    scores = batch.evaluate()
+    states = batch.game_states()
+    counts = np.concatenate([PositionBatch(batch.get_codes()[place:place + args.chunk],
+                                           batch.get_turn()[place:place + args.chunk],
+                                           batch.get_tallies()[place:place + args.chunk]).legal_move_counts()
+                             for place in range(0, len(batch), args.chunk)] or [np.zeros(0, dtype=np.int64)])
+    for score, state, count in zip(scores, states, counts):
+        print(json.dumps({'score': int(score), 'game_state': GAME_STATES[state], 'legal_moves': int(count)}))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
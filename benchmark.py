@@ -0,0 +1,234 @@
+# Description: Benchmark suite for ChessVar. Runs perft node counts (every legal move sequence to a fixed depth) from
+#              the starting ChessBoard and from a few saved positions and compares them with known-good totals for this
+#              variant's rules, then times the hot parts of the engine: make_move(), the ChessBoard path checks,
+#              take_piece(), game record replay, snapshot saving/loading, board rendering, reset_game() and board
+#              construction. Results come out as JSON so runs from different releases can be compared.
+#
+#              python benchmark.py                      # perft to depth 3 plus the microbenchmarks, JSON on stdout
+#              python benchmark.py --perft-depth 4 --output bench.json
+
+import argparse
+import json
+import platform
+import sys
+import time
+
+from ChessVar import ChessBoard, ChessVar
+
+
+# saved positions are stored as the moves that reach them from the start, since that's the one position everyone
+# agrees on. 'nodes' lists the known-good perft totals for depth 1, 2, 3, ... from that position.
+SAVED_POSITIONS = {
+    'start': {
+        'moves': '',
+        'nodes': [20, 400, 8982, 202078],
+    },
+    'quiet_opening': {
+        'moves': 'd2d3 c7c5 a2a3 g8h6 b1c3 h6g4 c3b1 g7g5 c1d2 d7d5',
+        'nodes': [27, 889, 24718, 847598],
+    },
+    'pawn_captures': {  # includes a two-space diagonal Pawn capture on its first move (c2b4)
+        'moves': 'a2a4 g7g6 e2e4 g8f6 f1e2 e7e6 h2h4 g6g5 g2g3 d7d6 g3g4 h7h5 g1h3 f7f5 e2c4 b7b5 a1a2 b5b4 c4d5 d8e7 '
+                 'e1e2 f6g8 c2b4 e7h7',
+        'nodes': [39, 1327, 51623, 1758429],
+    },
+    'knight_race': {  # white has one black Knight already, so a second Knight capture ends the game
+        'moves': 'b1a3 g8f6 f2f4 b7b6 d2d4 h7h5 f4f5 c8b7 d1d3 a7a5 c1f4 e7f5 h2h4 b7a6 e1f2 f8e7 a3c4 a6b5 f4h6 g7g5 '
+                 'f2f3 e7f8 d3b3 a5a4 f3f4 h8h6 h4g5 d7d6 d4d5 b8c6 b3g3 c6e5 d5e5 h5h4 a1d1 c7c6 c4a3 e8d7 d1b1 b5d3',
+        'nodes': [44, 1818, 76752, 3177781],
+    },
+}
+
+
+def load_position(moves):
+    """returns a new ChessVar with the space-separated moves (e.g. 'e2e4 e7e5') already played"""
+    game = ChessVar()
+    result = game.apply_moves(moves)
+    if result['failed'] is not None:
+        raise ValueError('illegal move in saved position: ' + moves.split()[result['failed']])
+    return game
+
+
+def perft(game, depth):
+    """
+    counts the positions reached by every legal move sequence of exactly depth moves. A finished game has no legal
+    moves, so a win before the last move counts for nothing
+    """
+    if depth == 0:
+        return 1
+    nodes = 0
+    for start_loc, end_loc in game.legal_moves():
+        game.push_move(start_loc, end_loc)
+        nodes += perft(game, depth - 1)
+        game.pop_move()
+    return nodes
+
+
+def run_perft(max_depth):
+    """runs perft on every saved position up to max_depth and returns one result dictionary per (position, depth)"""
+    results = []
+    for name, position in SAVED_POSITIONS.items():
+        game = load_position(position['moves'])
+        for depth in range(1, max_depth + 1):
+            began = time.perf_counter()
+            nodes = perft(game, depth)
+            seconds = time.perf_counter() - began
+            expected = position['nodes'][depth - 1] if depth <= len(position['nodes']) else None
+            results.append({'position': name,
+                            'depth': depth,
+                            'nodes': nodes,
+                            'expected': expected,
+                            'ok': expected is None or nodes == expected,
+                            'seconds': seconds,
+                            'nodes_per_second': nodes / seconds if seconds else None})
+    return results
+
+
+def time_calls(func, calls, repeat):
+    """calls func() calls times, repeat times over, and returns the best average seconds per call"""
+    best = None
+    for attempt in range(repeat):
+        began = time.perf_counter()
+        for call in range(calls):
+            func()
+        per_call = (time.perf_counter() - began) / calls
+        if best is None or per_call < best:
+            best = per_call
+    return best
+
+
+def bench_make_move(calls, repeat):
+    """legal make_move() calls. The Knights hop out and back so the game cycles through the same four positions"""
+    game = ChessVar()
+    cycle = [('b1', 'c3'), ('b8', 'c6'), ('c3', 'b1'), ('c6', 'b8')]
+    position = [0]
+
+    def move():
+        start_loc, end_loc = cycle[position[0]]
+        game.make_move(start_loc, end_loc)
+        position[0] = (position[0] + 1) % 4
+    return time_calls(move, calls, repeat)
+
+
+def bench_threats(calls, repeat):
+    """
+    the bench_make_move() Knight cycle with a get_threatened() query after every move, so each call pays for one
+    incremental attack map update
+    """
+    game = ChessVar()
+    cycle = [('b1', 'c3'), ('b8', 'c6'), ('c3', 'b1'), ('c6', 'b8')]
+    position = [0]
+
+    def move():
+        start_loc, end_loc = cycle[position[0]]
+        game.make_move(start_loc, end_loc)
+        game.get_threatened(game.get_turn())
+        position[0] = (position[0] + 1) % 4
+    return time_calls(move, calls, repeat)
+
+
+def bench_rejected_move(calls, repeat):
+    """make_move() calls that fail the path check (the Rook on A1 is boxed in by its own Pawn)"""
+    game = ChessVar()
+    return time_calls(lambda: game.make_move('a1', 'a5'), calls, repeat)
+
+
+CAPTURED_PAWNS = ('a7', 'b7', 'c7', 'd7', 'e7', 'f7', 'g7')  # the black Pawns bench_take_piece() captures
+
+
+def bench_take_piece(calls, repeat):
+    """
+    take_piece() calls. Each fresh game has seven different black Pawns (a7 to g7) captured, since an eighth would
+    end the game, and the games are built before the clock starts
+    """
+    best = None
+    for attempt in range(repeat):
+        games = [ChessVar() for game in range(calls // 7 + 1)]
+        began = time.perf_counter()
+        for game in games:
+            for location in CAPTURED_PAWNS:
+                game.take_piece(location)
+        per_call = (time.perf_counter() - began) / (len(games) * 7)
+        if best is None or per_call < best:
+            best = per_call
+    return best
+
+
+def bench_replay(calls, repeat, batched):
+    """
+    replays the knight_race record (40 moves) into fresh games, either in one apply_moves() call per game or one
+    make_move() call per move, and returns the seconds per move. The games are built before the clock starts
+    """
+    record = SAVED_POSITIONS['knight_race']['moves']
+    pairs = [(move[0:2], move[2:4]) for move in record.split()]
+    best = None
+    for attempt in range(repeat):
+        games = [ChessVar() for game in range(calls // len(pairs) + 1)]
+        began = time.perf_counter()
+        for game in games:
+            if batched:
+                game.apply_moves(record)
+            else:
+                for start_loc, end_loc in pairs:
+                    game.make_move(start_loc, end_loc)
+        per_call = (time.perf_counter() - began) / (len(games) * len(pairs))
+        if best is None or per_call < best:
+            best = per_call
+    return best
+
+
+def run_microbenchmarks(calls, repeat):
+    """times each hot call and returns a dictionary of name -> microseconds per call"""
+    board = ChessBoard()
+    game = ChessVar()
+    snapshot = load_position(SAVED_POSITIONS['knight_race']['moves']).to_bytes()
+    timings = {
+        'make_move': bench_make_move(calls, repeat),
+        'make_move_rejected': bench_rejected_move(calls, repeat),
+        'make_move_threats': bench_threats(calls, repeat),
+        'check_rook_path': time_calls(lambda: board.check_rook_path('a1', 'a8'), calls, repeat),
+        'check_bishop_path': time_calls(lambda: board.check_bishop_path('c1', 'h6'), calls, repeat),
+        'take_piece': bench_take_piece(calls, repeat),
+        'replay_make_move': bench_replay(calls, repeat, False),
+        'replay_apply_moves': bench_replay(calls, repeat, True),
+        'to_bytes': time_calls(game.to_bytes, calls // 10 + 1, repeat),
+        'from_bytes': time_calls(lambda: ChessVar.from_bytes(snapshot), calls // 10 + 1, repeat),
+        'render_board': time_calls(game.render_board, calls, repeat),
+        'reset_game': time_calls(game.reset_game, calls // 10 + 1, repeat),
+        'chess_board': time_calls(ChessBoard, calls // 10 + 1, repeat),
+        'legal_moves': time_calls(game.legal_moves, calls // 10 + 1, repeat),
+    }
+    return {name: seconds * 1e6 for name, seconds in timings.items()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Perft and move-throughput benchmarks for ChessVar.')
+    parser.add_argument('--perft-depth', type=int, default=3, help='deepest perft to run (default 3)')
+    parser.add_argument('--calls', type=int, default=20000, help='calls per microbenchmark timing run')
+    parser.add_argument('--repeat', type=int, default=5, help='timing runs per microbenchmark, best is kept')
+    parser.add_argument('--skip-micro', action='store_true', help='only run perft')
+    parser.add_argument('--output', help='write the JSON report to this file instead of stdout')
+    args = parser.parse_args(argv)
+
+    perft_results = run_perft(args.perft_depth)
+    report = {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'perft_ok': all(result['ok'] for result in perft_results),
+        'perft': perft_results,
+        'micro_us': {} if args.skip_micro else run_microbenchmarks(args.calls, args.repeat),
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as output:
+            output.write(text + '\n')
+    else:
+        print(text)
+    return 0 if report['perft_ok'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,269 @@
+# Description: Built-in search engine for ChessVar. Runs iterative-deepening alpha-beta (negamax) over the game's own
+#              legal_moves()/push_move()/pop_move(), with a transposition table, capture-first move ordering and a short
+#              capture-only search at the leaves. The evaluation knows this variant's victory rule: a team wins as soon
+#              as it has taken both Knights, both Bishops, both Rooks, the King, the Queen or all eight Pawns, so
+#              positions are scored by how close each side is to finishing one of those sets.
+
+import time
+
+from ChessVar import CAPTURE_LIMITS, TranspositionTable
+
+
+WIN_SCORE = 100000  # a finished game. Wins found sooner score higher: WIN_SCORE - plies from the root
+WIN_BOUND = WIN_SCORE - 1000  # anything past this is a forced win or loss rather than an evaluation
+PROGRESS_SCALE = 1000  # points for a completely finished set, the evaluation is built out of fractions of this
+QUIESCENCE_DEPTH = 4  # how many captures deep the leaf search will look
+
+
+class SearchTimeout(Exception):
+    """raised inside the search when the time limit runs out so the deepest finished iteration can be used"""
+
+
+def set_progress(count, kind):
+    """
+    returns how far along a team is (0.0 to 1.0) toward winning with the piece type code kind after count captures. The
+    fraction is squared so the second Rook counts for more than the first, and a team closing in on one set is
+    preferred to one spread thinly over several
+    """
+    return (count / CAPTURE_LIMITS[kind]) ** 2
+
+
+def evaluate(game):
+    """
+    scores the position from the point of view of the team whose turn it is. Each team's score is its best set
+    progress plus a quarter of its total progress, so the race to the nearest finished set dominates but every
+    capture still counts. Positive means the side to move is ahead.
+    """
+    scores = {}
+    for team in ('White', 'Black'):
+        progress = [set_progress(count, kind) for kind, count in enumerate(game.get_capture_tallies(team))]
+        scores[team] = PROGRESS_SCALE * (max(progress) + sum(progress) / 4)
+    if game.get_turn() == 'White':
+        return int(scores['White'] - scores['Black'])
+    return int(scores['Black'] - scores['White'])
+
+
+def capture_value(game, piece):
+    """returns how much taking piece would move the side to move toward a win. King and Queen captures end the game"""
+    kind = piece.get_kind()
+    count = game.get_capture_tallies(game.get_turn())[kind]
+    if count + 1 >= CAPTURE_LIMITS[kind]:
+        return WIN_SCORE
+    return int(PROGRESS_SCALE * (set_progress(count + 1, kind) - set_progress(count, kind)))
+
+
+class Searcher:
+    """
+    represents one search of a ChessVar position. Holds the transposition table, the clock and the node counter.
+    The game is searched in place with push_move()/pop_move() and always handed back unchanged, even on a timeout.
+    """
+
+    def __init__(self, game, table, time_limit=None, tablebase=None):
+        self._game = game
+        self._table = table
+        self._tablebase = tablebase
+        self._deadline = None if time_limit is None else time.perf_counter() + time_limit
+        self._nodes = 0
+
+    def get_nodes(self):
+        """returns the number of positions visited so far"""
+        return self._nodes
+
+    def ordered_moves(self, first=None):
+        """
+        returns the legal moves with the stored best move (first) up front, then captures with the most valuable
+        victim first, then everything else
+        """
+        game = self._game
+        scored = []
+        for move in game.legal_moves():
+            if move == first:
+                scored.append((WIN_SCORE * 2, move))
+                continue
+            victim = game.get_position(move[1])
+            if victim is not None:
+                scored.append((capture_value(game, victim), move))
+            else:
+                scored.append((-1, move))
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return [move for score, move in scored]
+
+    def _check_clock(self):
+        """raises SearchTimeout once the deadline has passed. Only checked every 1024 nodes to keep it cheap"""
+        if self._deadline is not None and self._nodes & 1023 == 0 and time.perf_counter() > self._deadline:
+            raise SearchTimeout()
+
+    def _quiesce(self, alpha, beta, ply, depth):
+        """
+        searches captures only, so the evaluation isn't taken in the middle of an exchange. The side to move may
+        also 'stand pat' and keep the static score
+        """
+        self._nodes += 1
+        self._check_clock()
+        game = self._game
+        if game.get_game_state() != 'UNFINISHED':
+            return -(WIN_SCORE - ply)  # the previous move won the game
+        stand_pat = evaluate(game)
+        if stand_pat >= beta or depth == 0:
+            return stand_pat
+        alpha = max(alpha, stand_pat)
+        for move in self.ordered_moves():
+            if game.get_position(move[1]) is None:
+                break  # captures are sorted first, so the rest are quiet moves
+            game.push_move(*move)
+            try:
+                score = -self._quiesce(-beta, -alpha, ply + 1, depth - 1)
+            finally:
+                game.pop_move()
+            if score >= beta:
+                return score
+            alpha = max(alpha, score)
+        return alpha
+
+    def negamax(self, depth, alpha, beta, ply):
+        """returns the score of the current position searched depth moves deep, from the side to move's view"""
+        self._nodes += 1
+        self._check_clock()
+        game = self._game
+        if game.get_game_state() != 'UNFINISHED':
+            return -(WIN_SCORE - ply)
+        if self._tablebase is not None:
+            result = self._tablebase.probe(game)
+            if result is not None:
+                return tablebase_score(result, ply)
+        if depth == 0:
+            return self._quiesce(alpha, beta, ply, QUIESCENCE_DEPTH)
+
+        key = game.get_hash()
+        original_alpha = alpha
+        stored_move = None
+        entry = self._table.probe(key)
+        if entry is not None:
+            stored_depth, value, flag, stored_move = entry
+            value = from_table(value, ply)
+            if stored_depth >= depth:
+                if flag == TranspositionTable.EXACT:
+                    return value
+                if flag == TranspositionTable.LOWER_BOUND:
+                    alpha = max(alpha, value)
+                elif flag == TranspositionTable.UPPER_BOUND:
+                    beta = min(beta, value)
+                if alpha >= beta:
+                    return value
+
+        moves = self.ordered_moves(stored_move)
+        if not moves:
+            return 0  # no legal moves but nobody has won: nothing to play for
+        best_score = -WIN_SCORE * 2
+        best_move = None
+        for move in moves:
+            game.push_move(*move)
+            try:
+                score = -self.negamax(depth - 1, -beta, -alpha, ply + 1)
+            finally:
+                game.pop_move()
+            if score > best_score:
+                best_score = score
+                best_move = move
+            alpha = max(alpha, score)
+            if alpha >= beta:
+                break
+
+        if best_score <= original_alpha:
+            flag = TranspositionTable.UPPER_BOUND
+        elif best_score >= beta:
+            flag = TranspositionTable.LOWER_BOUND
+        else:
+            flag = TranspositionTable.EXACT
+        self._table.store(key, depth, to_table(best_score, ply), flag, best_move)
+        return best_score
+
+    def search_root(self, depth):
+        """searches every root move to depth and returns (best move, score)"""
+        game = self._game
+        entry = self._table.probe(game.get_hash())
+        best_move = None
+        best_score = -WIN_SCORE * 2
+        alpha = -WIN_SCORE * 2
+        for move in self.ordered_moves(entry[3] if entry is not None else None):
+            game.push_move(*move)
+            try:
+                score = -self.negamax(depth - 1, -WIN_SCORE * 2, -alpha, 1)
+            finally:
+                game.pop_move()
+            if score > best_score:
+                best_score = score
+                best_move = move
+            alpha = max(alpha, score)
+        if best_move is not None:
+            self._table.store(game.get_hash(), depth, best_score, TranspositionTable.EXACT, best_move)
+        return best_move, best_score
+
+
+def to_table(score, ply):
+    """converts a win score counted from the root into one counted from this node, so it can be reused elsewhere"""
+    if score > WIN_BOUND:
+        return score + ply
+    if score < -WIN_BOUND:
+        return score - ply
+    return score
+
+
+def from_table(score, ply):
+    """undoes to_table() for a node ply moves from the root"""
+    if score > WIN_BOUND:
+        return score - ply
+    if score < -WIN_BOUND:
+        return score + ply
+    return score
+
+
+def tablebase_score(result, ply):
+    """converts a tablebase.py probe() result for a node ply moves from the root into a search score"""
+    if result > 0:
+        return WIN_SCORE - (ply + result)
+    if result < 0:
+        return -(WIN_SCORE - (ply - result))
+    return 0
+
+
+def search(game, depth=4, time_limit=None, table=None, book=None, tablebase=None):
+    """
+    runs iterative deepening from depth 1 up to depth and returns a dictionary with the best 'move' found (None when
+    there are no legal moves), its 'score', the deepest finished 'depth', the 'nodes' visited and whether the move
+    came from the 'book'. If time_limit (seconds) runs out, the answer from the deepest finished iteration is
+    returned. A forced win stops the search early since searching deeper can't find anything better. When an
+    OpeningBook (see opening_book.py) is passed as book and covers the position, its heaviest move is played
+    without searching. Likewise a Tablebase (see tablebase.py) answers exactly for the positions it covers, at the
+    root and anywhere inside the search.
+    """
+    result = {'move': None, 'score': 0, 'depth': 0, 'nodes': 0, 'book': False}
+    if game.get_game_state() != 'UNFINISHED':
+        return result
+    if book is not None:
+        result['move'] = book.choose(game)
+        if result['move'] is not None:
+            result['book'] = True
+            return result
+    if tablebase is not None:
+        found = tablebase.best_move(game)
+        if found is not None:
+            result['move'], result['score'] = found[0], tablebase_score(found[1], 0)
+            return result
+    if table is None:
+        table = TranspositionTable()
+    table.new_search()
+    searcher = Searcher(game, table, time_limit, tablebase)
+    for iteration in range(1, depth + 1):
+        try:
+            move, score = searcher.search_root(iteration)
+        except SearchTimeout:
+            break
+        result = {'move': move, 'score': score, 'depth': iteration, 'nodes': searcher.get_nodes(), 'book': False}
+        if move is None or abs(score) > WIN_BOUND:
+            break
+    if result['move'] is None and result['depth'] == 0:
+        moves = searcher.ordered_moves()  # ran out of time before depth 1 finished: fall back on move ordering
+        result['move'] = moves[0] if moves else None
+    result['nodes'] = searcher.get_nodes()
+    return result
@@ -0,0 +1,117 @@
+# Description: Load generator for server.py. Opens thousands of simulated clients against a running server on
+#              localhost. Each client creates a session and plays random legal games (asking the server for the
+#              legal moves before every move) until it has made its share of moves. It then closes the session and
+#              reports requests per second and latency percentiles as JSON.
+#
+#              python server.py --port 8765 &
+#              python loadtest.py --port 8765 --clients 2000 --moves 50
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+
+
+class Client:
+    """represents one simulated client: one connection, one session, and the latency of every request it sent"""
+
+    def __init__(self, reader, writer, generator):
+        self._reader = reader
+        self._writer = writer
+        self._random = generator
+        self._session = None
+        self.latencies = []
+        self.errors = 0
+
+    async def request(self, **request):
+        """sends one request, waits for its reply and returns the reply dictionary"""
+        began = time.perf_counter()
+        self._writer.write((json.dumps(request) + '\n').encode())
+        await self._writer.drain()
+        line = await self._reader.readline()
+        self.latencies.append(time.perf_counter() - began)
+        if not line:
+            raise ConnectionError('server closed the connection')
+        reply = json.loads(line)
+        if not reply['ok']:
+            self.errors += 1
+        return reply
+
+    async def play(self, moves):
+        """creates a session and plays random legal moves until moves have been made, starting new games as needed"""
+        self._session = (await self.request(op='create'))['session']
+        made = 0
+        while made < moves:
+            legal = (await self.request(op='legal', session=self._session))['moves']
+            if not legal:
+                await self.request(op='reset', session=self._session)
+                continue
+            move = self._random.choice(legal)
+            await self.request(op='move', session=self._session, start=move[0:2], end=move[2:4])
+            made += 1
+        await self.request(op='close', session=self._session)
+
+    async def close(self):
+        """hangs up the connection"""
+        self._writer.close()
+        await self._writer.wait_closed()
+
+
+def percentile(ordered, fraction):
+    """returns the value fraction of the way through the sorted list ordered"""
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def run(host='127.0.0.1', port=8765, clients=1000, moves=50, connect_limit=500, seed=0):
+    """
+    runs clients simulated clients at once and returns the summary dictionary. connect_limit caps how many are
+    allowed to be opening connections at the same moment so the listen backlog isn't overrun
+    """
+    gate = asyncio.Semaphore(connect_limit)
+
+    async def one(number):
+        async with gate:
+            reader, writer = await asyncio.open_connection(host, port)
+        client = Client(reader, writer, random.Random(seed * 1000003 + number))
+        try:
+            await client.play(moves)
+        finally:
+            await client.close()
+        return client
+
+    began = time.perf_counter()
+    results = await asyncio.gather(*(one(number) for number in range(clients)), return_exceptions=True)
+    seconds = time.perf_counter() - began
+    finished = [result for result in results if isinstance(result, Client)]
+    latencies = sorted(latency for client in finished for latency in client.latencies)
+    summary = {'clients': clients,
+               'finished': len(finished),
+               'failed': len(results) - len(finished),
+               'requests': len(latencies),
+               'errors': sum(client.errors for client in finished),
+               'seconds': round(seconds, 3),
+               'requests_per_second': round(len(latencies) / seconds, 1) if seconds else None}
+    if latencies:
+        summary['latency_ms'] = {name: round(percentile(latencies, fraction) * 1000, 3)
+                                 for name, fraction in (('p50', 0.5), ('p90', 0.9), ('p99', 0.99), ('max', 1.0))}
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Drive a ChessVar server with many simulated clients.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--clients', type=int, default=1000, help='simulated clients, all running at once')
+    parser.add_argument('--moves', type=int, default=50, help='moves each client makes')
+    parser.add_argument('--connect-limit', type=int, default=500, help='most connections being opened at once')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    summary = asyncio.run(run(args.host, args.port, args.clients, args.moves, args.connect_limit, args.seed))
+    print(json.dumps(summary, indent=2))
+    return 0 if summary['failed'] == 0 and summary['errors'] == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
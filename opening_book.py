@@ -0,0 +1,179 @@
+# Description: Opening book for ChessVar. Built offline from finished games (an archive.py archive or selfplay.py
+#              --moves output) by counting which moves were played from each early position, weighted by how the game
+#              turned out for the side that played them. The book is one sorted binary file of fixed-size records
+#              (position hash, move, weight), memory-mapped and binary searched, so a lookup costs a handful of reads
+#              no matter how big the book is. engine.search(), ChessVar.best_move() and the selfplay.py players
+#              take a book and play straight from it while the position is covered.
+#
+#              python opening_book.py build book.bin --archive games.bin --plies 12
+#              python opening_book.py build book.bin --selfplay results.jsonl
+#              python opening_book.py probe book.bin --moves "e2e4 e7e5"
+
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+
+from ChessVar import ChessVar, SQUARE_NAMES, SQUARES
+
+
+MAGIC = b'CVBOOK1\n'  # first bytes of every book file
+RECORD = struct.Struct('<QHI')  # position hash, move (start square index * 64 + end square index), weight
+RESULT_WEIGHTS = {'won': 2, 'unfinished': 1, 'lost': 0}  # weight a move earns from the game's result for its mover
+
+
+def encode_move(start_loc, end_loc):
+    """packs a move into the two-byte form stored in the book"""
+    return SQUARES[start_loc] * 64 + SQUARES[end_loc]
+
+
+def decode_move(move):
+    """unpacks a stored move into a ('E2', 'E4') pair"""
+    return SQUARE_NAMES[move >> 6], SQUARE_NAMES[move & 63]
+
+
+def count_moves(games, plies=12):
+    """
+    returns a dictionary of (position hash, move) -> weight from games, an iterable of (moves, final game state)
+    where moves is a list of (start, end) pairs. Only the first plies moves of each game are counted
+    """
+    weights = {}
+    for moves, game_state in games:
+        game = ChessVar()
+        for start_loc, end_loc in moves[:plies]:
+            key = game.get_hash()
+            mover = game.get_turn()
+            if game.make_move(start_loc, end_loc) is not True:
+                break  # a bad record, keep what was counted before it
+            if game_state == 'UNFINISHED':
+                result = 'unfinished'
+            else:
+                result = 'won' if game_state == mover.upper() + '_WON' else 'lost'
+            entry = (key, encode_move(start_loc, end_loc))
+            weights[entry] = weights.get(entry, 0) + RESULT_WEIGHTS[result]
+    return weights
+
+
+def write_book(path, weights, min_weight=2):
+    """
+    writes the book file from a count_moves() dictionary, dropping moves below min_weight. Records are sorted by
+    hash, and by weight (heaviest first) within a position. Returns the number of records written
+    """
+    records = sorted(((key, move, weight) for (key, move), weight in weights.items() if weight >= min_weight),
+                     key=lambda record: (record[0], -record[2], record[1]))
+    with open(path + '.tmp', 'wb') as file:
+        file.write(MAGIC)
+        file.write(b''.join(RECORD.pack(key, move, min(weight, 0xFFFFFFFF)) for key, move, weight in records))
+    os.replace(path + '.tmp', path)
+    return len(records)
+
+
+class OpeningBook:
+    """read-only view of a book file, memory-mapped. An empty or missing file is an empty book"""
+
+    def __init__(self, path):
+        self._data = b''
+        if os.path.exists(path) and os.path.getsize(path) > len(MAGIC):
+            with open(path, 'rb') as file:
+                self._data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            if self._data[:len(MAGIC)] != MAGIC:
+                raise ValueError('not a ChessVar opening book: ' + path)
+        self._count = max(len(self._data) - len(MAGIC), 0) // RECORD.size
+
+    def __len__(self):
+        return self._count
+
+    def _record(self, index):
+        """returns the record at index"""
+        return RECORD.unpack_from(self._data, len(MAGIC) + index * RECORD.size)
+
+    def lookup(self, key):
+        """returns the book moves for position hash key as a list of ((start, end), weight), heaviest first"""
+        low, high = 0, self._count
+        while low < high:  # leftmost record with this hash
+            middle = (low + high) // 2
+            if self._record(middle)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        moves = []
+        while low < self._count:
+            found, move, weight = self._record(low)
+            if found != key:
+                break
+            moves.append((decode_move(move), weight))
+            low += 1
+        return moves
+
+    def choose(self, game, generator=None):
+        """
+        returns a book move for game, or None if the position isn't in the book. With a random generator the
+        move is picked in proportion to its weight, otherwise the heaviest move is played. Moves that aren't legal
+        (a hash collision) are skipped
+        """
+        candidates = [(move, weight) for move, weight in self.lookup(game.get_hash())
+                      if game.rejection_reason(move[0], move[1]) is None]
+        if not candidates:
+            return None
+        if generator is None:
+            return candidates[0][0]
+        pick = generator.uniform(0, sum(weight for move, weight in candidates))
+        for move, weight in candidates:
+            pick -= weight
+            if pick <= 0:
+                return move
+        return candidates[-1][0]
+
+
+def archive_games(path):
+    """yields (moves, final game state) for every game in an archive.py archive"""
+    from archive import ArchiveReader  # only needed when building from an archive
+    reader = ArchiveReader(path)
+    for number in range(len(reader)):
+        yield reader.get_moves(number), reader.get_entry(number)[1]
+
+
+def selfplay_games(path):
+    """yields (moves, final game state) for every game in a selfplay.py --moves results file"""
+    with open(path) as file:
+        for line in file:
+            if line.strip():
+                result = json.loads(line)
+                moves = [(move[0:2], move[2:4]) for move in result.get('moves', '').split()]
+                yield moves, result['game_state']
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build or probe a ChessVar opening book.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help='build a book from finished games')
+    build.add_argument('book')
+    build.add_argument('--archive', action='append', default=[], help='archive.py archive to read games from')
+    build.add_argument('--selfplay', action='append', default=[], help='selfplay.py --moves results to read')
+    build.add_argument('--plies', type=int, default=12, help='how many moves into each game to count')
+    build.add_argument('--min-weight', type=int, default=2, help='drop moves with less total weight than this')
+    probe = commands.add_parser('probe', help='print the book moves for a position')
+    probe.add_argument('book')
+    probe.add_argument('--moves', default='', help='moves from the start that reach the position, e.g. "e2e4"')
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        weights = {}
+        sources = [archive_games(path) for path in args.archive] + [selfplay_games(path) for path in args.selfplay]
+        for source in sources:
+            for entry, weight in count_moves(source, args.plies).items():
+                weights[entry] = weights.get(entry, 0) + weight
+        print(json.dumps({'records': write_book(args.book, weights, args.min_weight)}))
+    else:
+        game = ChessVar()
+        if game.apply_moves(args.moves)['failed'] is not None:
+            parser.error('illegal move in --moves')
+        for (start_loc, end_loc), weight in OpeningBook(args.book).lookup(game.get_hash()):
+            print((start_loc + end_loc).lower(), weight)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
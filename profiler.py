@@ -0,0 +1,139 @@
+# Description: Opt-in instrumentation for the ChessVar hot paths. While a Profiler is enabled it counts and times
+#              every call to ChessVar.make_move(), take_piece() and reset_game(), and splits make_move() results into
+#              accepted moves and rejected ones by reason (see ChessVar.rejection_reason()).
+#              It works by swapping wrapped versions of those methods onto the classes, so it covers every game in the
+#              process, including ones that already exist, and disabling it puts the original methods back. When it's
+#              off nothing is wrapped and the cost is zero.
+#
+#              with Profiler() as profile:
+#                  ...play games...
+#              print(profile.snapshot())
+#
+#              apply_moves() checks moves itself rather than through make_move(), so batched replays only show up
+#              under take_piece().
+
+import time
+from functools import wraps
+
+from ChessVar import ChessVar
+
+
+REJECTION_REASONS = ('game_over', 'empty_square', 'wrong_turn', 'own_piece', 'geometry', 'obstructed')
+HOOKS = ((ChessVar, 'make_move'), (ChessVar, 'take_piece'), (ChessVar, 'reset_game'))  # (class, method name) pairs wrapped
+
+
+class Profiler:
+    """
+    represents one instrumentation session. Only one Profiler can be enabled at a time since they share the class
+    methods. Usable as a context manager, or with enable()/disable() to attach to and detach from a running process.
+    """
+
+    _active = None  # the enabled Profiler, if any
+
+    def __init__(self):
+        self._originals = {}
+        self._enabled_at = None
+        self._elapsed = 0.0
+        self._calls = {name: 0 for owner, name in HOOKS}
+        self._seconds = {name: 0.0 for owner, name in HOOKS}
+        self._accepted = 0
+        self._reasons = dict.fromkeys(REJECTION_REASONS, 0)
+
+    def __enter__(self):
+        self.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.disable()
+
+    def reset(self):
+        """zeroes every counter. The dictionaries are cleared in place since the wrappers hold on to them"""
+        for owner, name in HOOKS:
+            self._calls[name] = 0
+            self._seconds[name] = 0.0
+        for reason in REJECTION_REASONS:
+            self._reasons[reason] = 0
+        self._accepted = 0
+
+    def is_enabled(self):
+        """returns True while the methods are wrapped"""
+        return self._enabled_at is not None
+
+    def enable(self):
+        """wraps the hot methods. Raises RuntimeError if another Profiler is already enabled"""
+        if Profiler._active is self:
+            return
+        if Profiler._active is not None:
+            raise RuntimeError('another Profiler is already enabled')
+        for owner, name in HOOKS:
+            original = owner.__dict__[name]
+            self._originals[(owner, name)] = original
+            setattr(owner, name, self._wrap_move(original) if name == 'make_move' else self._wrap(name, original))
+        Profiler._active = self
+        self._enabled_at = time.perf_counter()
+
+    def disable(self):
+        """puts the original methods back. The counters are kept for snapshot()"""
+        if Profiler._active is not self:
+            return
+        for (owner, name), original in self._originals.items():
+            setattr(owner, name, original)
+        self._originals = {}
+        Profiler._active = None
+        self._elapsed += time.perf_counter() - self._enabled_at
+        self._enabled_at = None
+
+    def _wrap(self, name, original):
+        """returns original wrapped to count its calls and time them"""
+        calls, seconds, clock = self._calls, self._seconds, time.perf_counter
+
+        @wraps(original)
+        def wrapper(*args):
+            began = clock()
+            try:
+                return original(*args)
+            finally:
+                seconds[name] += clock() - began
+                calls[name] += 1
+        return wrapper
+
+    def _wrap_move(self, original):
+        """returns make_move() wrapped to count and time it and sort its results by rejection reason"""
+        calls, seconds, reasons, clock = self._calls, self._seconds, self._reasons, time.perf_counter
+        profiler = self
+
+        @wraps(original)
+        def make_move(game, start_loc, end_loc):
+            began = clock()
+            try:
+                result = original(game, start_loc, end_loc)
+            finally:
+                seconds['make_move'] += clock() - began
+                calls['make_move'] += 1
+            if result is True:
+                profiler._accepted += 1
+            else:
+                reasons[game.rejection_reason(start_loc, end_loc)] += 1  # worked out afterwards, off the clock
+            return result
+        return make_move
+
+    def snapshot(self):
+        """
+        returns the counters as a dictionary: whether the profiler is enabled, the seconds it has been enabled,
+        per-method calls, total seconds and mean microseconds, and make_move() accepted/rejected counts by reason
+        """
+        elapsed = self._elapsed
+        if self._enabled_at is not None:
+            elapsed += time.perf_counter() - self._enabled_at
+        methods = {}
+        for owner, name in HOOKS:
+            calls = self._calls[name]
+            methods[name] = {'calls': calls,
+                             'seconds': self._seconds[name],
+                             'mean_us': self._seconds[name] / calls * 1e6 if calls else None}
+        return {'enabled': self.is_enabled(),
+                'seconds': elapsed,
+                'methods': methods,
+                'moves': {'accepted': self._accepted,
+                          'rejected': sum(self._reasons.values()),
+                          'reasons': dict(self._reasons)}}
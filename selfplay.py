@@ -0,0 +1,199 @@
+# Description: Self-play harness for ChessVar. Plays many complete games in parallel on a process pool, one game per
+#              task, and streams one JSON line per finished game (winner, game state, length, captures and optionally
+#              the moves) to a file as soon as it finishes, so nothing piles up in memory. Each side can be played by
+#              a different player:
+#                random        - picks any legal move
+#                greedy        - takes the capture that moves it furthest toward a full set, otherwise plays randomly
+#                engine[:N]    - the engine.py alpha-beta search to depth N (default 2)
+#
+#              With --book, every player plays from an opening_book.py book while the position is covered, picking
+#              among the book moves in proportion to their weights so the openings still vary from game to game.
+#              With --tablebase, engine players play endings covered by the tablebase.py tables exactly.
+#
+#              python selfplay.py --games 10000 --white greedy --black engine:2 --output results.jsonl
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from abc import ABC, abstractmethod
+from multiprocessing import Pool
+
+from ChessVar import ChessVar, TranspositionTable
+from engine import capture_value, search
+from opening_book import OpeningBook
+from tablebase import Tablebase
+
+
+_books = {}  # book path -> OpeningBook, opened once per worker process
+_tablebases = {}  # table directory -> Tablebase, likewise
+
+
+class Player(ABC):
+    """base class for self-play players. choose_move() returns a legal (start, end) move for the side to move"""
+
+    def __init__(self, generator):
+        self._random = generator
+
+    @abstractmethod
+    def choose_move(self, game):
+        """returns one of game.legal_moves()"""
+
+
+class RandomPlayer(Player):
+    """plays a uniformly random legal move"""
+
+    def choose_move(self, game):
+        return self._random.choice(game.legal_moves())
+
+
+class GreedyPlayer(Player):
+    """plays the capture worth the most toward a full set, breaking ties at random, or a random move if none"""
+
+    def choose_move(self, game):
+        moves = game.legal_moves()
+        best_value = 0
+        best = []
+        for move in moves:
+            victim = game.get_position(move[1])
+            if victim is not None:
+                value = capture_value(game, victim)
+                if value > best_value:
+                    best_value = value
+                    best = [move]
+                elif value == best_value:
+                    best.append(move)
+        return self._random.choice(best or moves)
+
+
+class EnginePlayer(Player):
+    """
+    plays engine.search() at a fixed depth, keeping one transposition table for the whole game, and probing a
+    Tablebase if it's given one
+    """
+
+    def __init__(self, generator, depth=2, time_limit=None, tablebase=None):
+        super().__init__(generator)
+        self._depth = depth
+        self._time_limit = time_limit
+        self._table = TranspositionTable()
+        self._tablebase = tablebase
+
+    def choose_move(self, game):
+        return search(game, self._depth, self._time_limit, self._table, tablebase=self._tablebase)['move']
+
+
+def make_player(spec, generator, time_limit=None, tablebase=None):
+    """builds a Player from a command line spec: 'random', 'greedy' or 'engine' / 'engine:DEPTH'"""
+    name, _, depth = spec.partition(':')
+    if name == 'random':
+        return RandomPlayer(generator)
+    if name == 'greedy':
+        return GreedyPlayer(generator)
+    if name == 'engine':
+        return EnginePlayer(generator, int(depth) if depth else 2, time_limit, tablebase)
+    raise ValueError('unknown player: ' + spec)
+
+
+def play_game(task):
+    """
+    plays one complete game and returns its result dictionary. task is (game number, seed, white spec, black spec,
+    max plies, time limit per engine move, record moves, opening book path or None, tablebase directory or None). Runs
+    inside the worker processes
+    """
+    number, seed, white_spec, black_spec, max_plies, time_limit, record_moves, book_path, tablebase_path = task
+    generator = random.Random(seed)
+    book = None
+    if book_path is not None:
+        if book_path not in _books:
+            _books[book_path] = OpeningBook(book_path)
+        book = _books[book_path]
+    tablebase = None
+    if tablebase_path is not None:
+        if tablebase_path not in _tablebases:
+            _tablebases[tablebase_path] = Tablebase(tablebase_path)
+        tablebase = _tablebases[tablebase_path]
+    players = {'White': make_player(white_spec, generator, time_limit, tablebase),
+               'Black': make_player(black_spec, generator, time_limit, tablebase)}
+    game = ChessVar()
+    moves = []
+    began = time.perf_counter()
+    while game.get_game_state() == 'UNFINISHED' and len(moves) < max_plies:
+        if not game.legal_moves():
+            break  # stuck without a move, nobody can win from here
+        move = book.choose(game, generator) if book is not None else None
+        if move is None:
+            move = players[game.get_turn()].choose_move(game)
+        game.make_move(move[0], move[1])
+        moves.append((move[0] + move[1]).lower())
+
+    state = game.get_game_state()
+    result = {'game': number,
+              'seed': seed,
+              'white': white_spec,
+              'black': black_spec,
+              'winner': {'WHITE_WON': 'White', 'BLACK_WON': 'Black'}.get(state),
+              'game_state': state,
+              'plies': len(moves),
+              'white_captures': game.get_white_captures(),
+              'black_captures': game.get_black_captures(),
+              'seconds': round(time.perf_counter() - began, 4)}
+    if record_moves:
+        result['moves'] = ' '.join(moves)
+    return result
+
+
+def run(games, white='random', black='random', workers=None, output=sys.stdout, seed=0, max_plies=1000,
+        time_limit=None, record_moves=False, chunksize=4, book=None, tablebase=None):
+    """
+    plays games games on a pool of workers (default: one per CPU) and writes each result to output as a JSON line
+    the moment it comes back. Results arrive in finishing order, not game order. Returns a summary dictionary of
+    wins, unfinished games and total plies. book is the path of an opening_book.py book for the players to use and
+    tablebase the directory of tablebase.py tables for the engine players.
+    """
+    tasks = ((number, seed * 1000003 + number, white, black, max_plies, time_limit, record_moves, book, tablebase)
+             for number in range(games))
+    summary = {'games': 0, 'White': 0, 'Black': 0, 'unfinished': 0, 'plies': 0}
+    with Pool(workers or os.cpu_count()) as pool:
+        for result in pool.imap_unordered(play_game, tasks, chunksize):
+            output.write(json.dumps(result) + '\n')
+            output.flush()
+            summary['games'] += 1
+            summary['plies'] += result['plies']
+            summary[result['winner'] or 'unfinished'] += 1
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Play ChessVar games in parallel and stream the results.')
+    parser.add_argument('--games', type=int, default=100)
+    parser.add_argument('--white', default='random', help="'random', 'greedy' or 'engine[:depth]'")
+    parser.add_argument('--black', default='random', help="'random', 'greedy' or 'engine[:depth]'")
+    parser.add_argument('--workers', type=int, help='worker processes (default: one per CPU)')
+    parser.add_argument('--seed', type=int, default=0, help='base seed, game n uses a seed derived from it')
+    parser.add_argument('--max-plies', type=int, default=1000, help='give up on a game after this many moves')
+    parser.add_argument('--time-limit', type=float, help='seconds per engine move')
+    parser.add_argument('--moves', action='store_true', help='include the move list in each result')
+    parser.add_argument('--book', help='opening_book.py book to play from while it covers the position')
+    parser.add_argument('--tablebase', help='directory of tablebase.py tables for engine players to probe')
+    parser.add_argument('--output', help='JSON lines file to append results to (default: stdout)')
+    args = parser.parse_args(argv)
+
+    output = open(args.output, 'a') if args.output else sys.stdout
+    began = time.perf_counter()
+    try:
+        summary = run(args.games, args.white, args.black, args.workers, output, args.seed, args.max_plies,
+                      args.time_limit, args.moves, book=args.book,
+                      tablebase=args.tablebase)
+    finally:
+        if args.output:
+            output.close()
+    summary['seconds'] = round(time.perf_counter() - began, 2)
+    print(json.dumps(summary), file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,235 @@
+# Description: asyncio game server for ChessVar. Hosts any number of concurrent ChessVar sessions over TCP using a
+#              JSON lines protocol: every request is one JSON object on its own line and gets exactly one JSON object
+#              line back, in order. Requests carry an 'op' and, for everything but create and server-wide stats, the
+#              'session' id that create handed out. An optional 'id' is echoed back so clients can pipeline requests.
+#
+#                {"op": "create"}                                      -> {"ok": true, "session": 1}
+#                {"op": "move", "session": 1, "start": "e2", "end": "e4"} -> {"ok": true, "legal": true, ...}
+#                {"op": "state", "session": 1}     game state, turn and the to_text() position
+#                {"op": "captures", "session": 1}  both teams' capture lists
+#                {"op": "legal", "session": 1}     the legal moves for the side to move, e.g. ["e2e4", ...]
+#                {"op": "check", "session": 1, "start": "e2", "end": "e4"} -> {"ok": true, "legal": true}
+#                                                  asks about a move without making it
+#                {"op": "board", "session": 1, "style": "compact"}  the rendered board ('plain', 'ansi' or 'compact')
+#                {"op": "reset", "session": 1}     start the session's game over
+#                {"op": "stats", "session": 1}     per-session counters (or server-wide ones without a session)
+#                {"op": "close", "session": 1}     drop the session
+#                {"op": "profile", "action": "start"}  instrument the hot paths (see profiler.py); the other
+#                                                  actions are "snapshot", "reset" and "stop". Only when the
+#                                                  server runs with --allow-profile, since it affects every session
+#
+#              Each connection is served one request at a time and the game calls never await, so a session's moves
+#              always run one after another. Backpressure comes from the streams: a client that stops reading makes
+#              drain() wait, and the server stops reading requests from it while the reply buffer is full.
+#
+#              python server.py --port 8765
+#              python server.py --port 8765 --allow-profile
+
+import argparse
+import asyncio
+import itertools
+import json
+import sys
+import time
+
+from ChessVar import ChessVar, SQUARES
+from profiler import Profiler
+
+
+class Session:
+    """represents one hosted game plus the counters reported by the stats op"""
+
+    def __init__(self, number, bitboard=False):
+        self._number = number
+        self._game = ChessVar(bitboard)
+        self._created = time.time()
+        self._last_active = self._created
+        self._moves = 0
+        self._rejected = 0
+        self._requests = 0
+
+    def get_game(self):
+        """returns the session's ChessVar"""
+        return self._game
+
+    def touch(self):
+        """counts a request against the session"""
+        self._requests += 1
+        self._last_active = time.time()
+
+    def record_move(self, legal):
+        """counts a move attempt, legal or not"""
+        if legal:
+            self._moves += 1
+        else:
+            self._rejected += 1
+
+    def get_stats(self):
+        """returns the session's counters as a dictionary"""
+        return {'session': self._number,
+                'game_state': self._game.get_game_state(),
+                'requests': self._requests,
+                'moves': self._moves,
+                'rejected': self._rejected,
+                'created': self._created,
+                'idle_seconds': round(time.time() - self._last_active, 3)}
+
+
+class GameServer:
+    """
+    represents the server: the table of sessions plus the connection handler. Sessions belong to the server rather
+    than to a connection, so a client can reconnect and carry on with the same session id.
+    """
+
+    def __init__(self, max_sessions=100000, max_line=4096, allow_profile=False):
+        self._sessions = {}
+        self._numbers = itertools.count(1)
+        self._max_sessions = max_sessions
+        self._max_line = max_line
+        self._connections = 0
+        self._requests = 0
+        self._started = time.time()
+        self._profiler = Profiler()
+        self._allow_profile = allow_profile  # the profiler patches the shared classes, so it's off unless asked for
+
+    def get_stats(self):
+        """returns the server-wide counters as a dictionary"""
+        return {'sessions': len(self._sessions),
+                'connections': self._connections,
+                'requests': self._requests,
+                'uptime_seconds': round(time.time() - self._started, 3)}
+
+    def _session(self, request):
+        """returns the Session named by request['session'], or raises LookupError"""
+        number = request.get('session')
+        session = self._sessions.get(number) if type(number) is int else None  # ids are ints, not lists or bools
+        if session is None:
+            raise LookupError('unknown session: ' + str(request.get('session')))
+        session.touch()
+        return session
+
+    def dispatch(self, request):
+        """handles one decoded request and returns the reply dictionary. Bad requests raise LookupError/ValueError"""
+        op = request.get('op')
+        if op == 'create':
+            if len(self._sessions) >= self._max_sessions:
+                raise ValueError('session limit reached')
+            number = next(self._numbers)
+            self._sessions[number] = Session(number, request.get('bitboard') is True)
+            return {'session': number}
+
+        if op == 'stats' and 'session' not in request:
+            return self.get_stats()
+        if op == 'profile':
+            if not self._allow_profile:
+                raise ValueError('profiling is disabled on this server (start it with --allow-profile)')
+            action = request.get('action', 'snapshot')
+            if action == 'start':
+                self._profiler.enable()
+            elif action == 'stop':
+                self._profiler.disable()
+            elif action == 'reset':
+                self._profiler.reset()
+            elif action != 'snapshot':
+                raise ValueError('unknown profile action: ' + str(action))
+            return self._profiler.snapshot()
+        session = self._session(request)
+        game = session.get_game()
+
+        if op == 'move' or op == 'check':
+            start, end = request.get('start'), request.get('end')
+            if type(start) not in (str, int) or type(end) not in (str, int) or start not in SQUARES \
+                    or end not in SQUARES:  # type() rather than isinstance(), JSON true/false would pass as 1/0
+                raise ValueError(op + ' needs a start and end square, e.g. "e2" and "e4"')
+            if op == 'check':
+                return {'legal': game.is_legal(start, end)}
+            legal = game.make_move(start, end) is True
+            session.record_move(legal)
+            return {'legal': legal, 'game_state': game.get_game_state(), 'turn': game.get_turn()}
+        if op == 'state':
+            return {'game_state': game.get_game_state(), 'turn': game.get_turn(), 'position': game.to_text()}
+        if op == 'captures':
+            return {'white': game.get_white_captures(), 'black': game.get_black_captures()}
+        if op == 'board':
+            return {'board': game.render_board(request.get('style', 'compact'))}
+        if op == 'legal':
+            return {'moves': [(start + end).lower() for start, end in game.legal_moves()]}
+        if op == 'reset':
+            game.reset_game()
+            return {'game_state': game.get_game_state(), 'turn': game.get_turn()}
+        if op == 'stats':
+            return session.get_stats()
+        if op == 'close':
+            del self._sessions[request['session']]
+            return {}
+        raise ValueError('unknown op: ' + str(op))
+
+    def handle_line(self, line):
+        """decodes one request line, dispatches it and returns the encoded reply line"""
+        self._requests += 1
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError('request must be a JSON object')
+        except ValueError as error:
+            return json.dumps({'ok': False, 'error': str(error)}) + '\n'
+        try:
+            reply = self.dispatch(request)
+            reply['ok'] = True
+        except (LookupError, ValueError) as error:
+            reply = {'ok': False, 'error': error.args[0] if error.args else str(error)}
+        if 'id' in request:
+            reply['id'] = request['id']
+        return json.dumps(reply) + '\n'
+
+    async def handle_client(self, reader, writer):
+        """serves one connection until the client hangs up, one request line at a time"""
+        self._connections += 1
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:  # the line was longer than max_line
+                    writer.write(b'{"ok": false, "error": "request too long"}\n')
+                    break
+                if not line:
+                    break
+                if line.strip():
+                    writer.write(self.handle_line(line).encode())
+                    await writer.drain()  # waits here while the client isn't keeping up
+        except ConnectionError:
+            pass
+        finally:
+            self._connections -= 1
+            writer.close()
+
+    async def start(self, host='127.0.0.1', port=8765):
+        """starts listening and returns the asyncio server"""
+        return await asyncio.start_server(self.handle_client, host, port, limit=self._max_line)
+
+
+async def serve(host, port, max_sessions, max_line, allow_profile=False):
+    """runs a GameServer until it's cancelled"""
+    server = await GameServer(max_sessions, max_line, allow_profile).start(host, port)
+    print('serving on ' + ', '.join(str(sock.getsockname()) for sock in server.sockets), file=sys.stderr)
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Host ChessVar sessions over a JSON lines protocol.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--max-sessions', type=int, default=100000, help='refuse create past this many sessions')
+    parser.add_argument('--max-line', type=int, default=4096, help='longest request line in bytes')
+    parser.add_argument('--allow-profile', action='store_true', help='accept the profile op (it affects every session)')
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, args.max_sessions, args.max_line, args.allow_profile))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
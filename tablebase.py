@@ -0,0 +1,430 @@
+# Description: Endgame tablebases for ChessVar. A game is over the moment one team completes a set of captures, so
+#              once only a few pieces are left every position has an exact result: the side to move wins in n plies,
+#              loses in n plies, or nobody can ever force a win. This module solves such endings by retrograde
+#              analysis (working backwards from the winning captures) and writes one file per table, one byte per
+#              position, which is memory-mapped and probed with a single index calculation.
+#
+#              A table is the material on the board plus, for every piece, how many more captures of its type the
+#              other team needs to win with that set ("need", 0 when the set can no longer be finished with what is
+#              left). Captures that don't end the game lead into smaller tables, which are built first.
+#
+#              Tables grow 64 times with every extra piece, so this is practical up to three pieces.
+#
+#              python tablebase.py generate KRk KQkr --directory tables
+#              python tablebase.py generate --all 3 --kinds KQR --directory tables
+#              python tablebase.py probe tables "4k3/8/8/8/8/8/8/R3K3 w - 000100/000000"
+
+import argparse
+import itertools
+import json
+import mmap
+import os
+import sys
+
+from ChessVar import (BISHOP, BISHOP_RAYS, BLACK, CAPTURE_LIMITS, KING, KING_STEPS, KNIGHT, KNIGHT_JUMPS, PAWN,
+                      PIECE_CLASSES, PIECE_LETTERS, QUEEN_RAYS, ROOK, ROOK_RAYS, SQUARE_COORDS, WHITE, ChessVar,
+                      square_index)
+
+
+MAGIC = b'CVTBASE1'  # first bytes of every table file
+SUFFIX = '.cvtb'
+PAWN_START_ROWS = (2, 7)  # by team code, where a Pawn that still has its first move can be
+PAWN_SLOTS = 72  # squares 0-63 for a Pawn that has moved, 64-71 for one on its start row that still has its first move
+MAX_DISTANCE = 255  # longest win that fits in a byte
+
+
+def piece_code(side, kind):
+    """returns the code for a piece of team code side and piece type code kind, as in the table keys"""
+    return side * 6 + kind
+
+
+def table_key(pieces, tallies):
+    """
+    returns the table key for pieces, a list of (side, kind) pairs, when the teams' capture tallies are tallies
+    (indexed [team code][piece type code]). A key is a tuple of (piece code, need) pairs, white first and then
+    black, Kings first down to Pawns. Raises ValueError if a set is already complete
+    """
+    key = []
+    for side, kind in sorted(pieces, key=lambda piece: (piece[0], -piece[1])):
+        need = CAPTURE_LIMITS[kind] - tallies[1 - side][kind]
+        if need <= 0:
+            raise ValueError('that game is already over')
+        if need > pieces.count((side, kind)):
+            need = 0  # not enough of them left to finish the set
+        key.append((piece_code(side, kind), need))
+    return tuple(key)
+
+
+def table_name(key):
+    """returns the file name for key, e.g. 'KRk-101.cvtb': the pieces (black lowercase) and each piece's need"""
+    letters = ''.join(PIECE_LETTERS[code % 6] if code < 6 else PIECE_LETTERS[code % 6].lower() for code, need in key)
+    return letters + '-' + ''.join(str(need) for code, need in key) + SUFFIX
+
+
+def parse_material(text):
+    """returns the (side, kind) pairs for a material string like 'KRk' (white uppercase, black lowercase)"""
+    pieces = []
+    for letter in text:
+        if letter.upper() not in PIECE_LETTERS:
+            raise ValueError('unknown piece letter: ' + letter)
+        pieces.append((WHITE if letter.isupper() else BLACK, PIECE_LETTERS.index(letter.upper())))
+    return pieces
+
+
+def material_keys(pieces):
+    """returns every table key for pieces: one for each combination of needs that leaves the game unfinished"""
+    pieces = sorted(pieces, key=lambda piece: (piece[0], -piece[1]))
+    groups = sorted(set(pieces), key=lambda piece: (piece[0], -piece[1]))
+    choices = []
+    for side, kind in groups:
+        count = pieces.count((side, kind))
+        needs = list(range(1, min(CAPTURE_LIMITS[kind], count) + 1))
+        choices.append(needs + [0] if CAPTURE_LIMITS[kind] > count else needs)
+    keys = []
+    for needs in itertools.product(*choices):
+        group_needs = dict(zip(groups, needs))
+        keys.append(tuple((piece_code(side, kind), group_needs[(side, kind)]) for side, kind in pieces))
+    return keys
+
+
+def _slot_counts(key):
+    """returns how many slots each piece of key can be in"""
+    return [PAWN_SLOTS if code % 6 == PAWN else 64 for code, need in key]
+
+
+def _slot_square(code, slot):
+    """returns (square index, still has its first move) for a piece with code sitting in slot"""
+    if slot < 64:
+        return slot, False
+    return square_index(PAWN_START_ROWS[code // 6], slot - 63), True
+
+
+def _square_slot(code, square, first_move):
+    """returns the slot for a piece with code on square, or None if it can't be there in a table"""
+    if not first_move:
+        return square
+    number, letter = SQUARE_COORDS[square]
+    if code % 6 != PAWN or number != PAWN_START_ROWS[code // 6]:
+        return None
+    return 63 + letter
+
+
+def _strides(key):
+    """returns the index multiplier for each piece's slot. Index 0 and 1 of a position are its two turns"""
+    strides = []
+    stride = 2
+    for count in _slot_counts(key):
+        strides.append(stride)
+        stride *= count
+    return strides
+
+
+def table_size(key):
+    """returns the number of positions (and bytes of data) in the table for key"""
+    size = 2
+    for count in _slot_counts(key):
+        size *= count
+    return size
+
+
+def _targets(side, kind, square, first_move, occupant, sides):
+    """
+    returns the (end square index, piece index captured or None) moves for one piece, by the same rules as
+    ChessVar._piece_targets(): occupant maps square indexes to piece indexes and sides holds each piece's team code
+    """
+    moves = []
+    if kind == KNIGHT or kind == KING:
+        for end in (KNIGHT_JUMPS[square] if kind == KNIGHT else KING_STEPS[square]):
+            other = occupant.get(end)
+            if other is None:
+                moves.append((end, None))
+            elif sides[other] != side:
+                moves.append((end, other))
+        return moves
+
+    if kind == PAWN:
+        number, letter = SQUARE_COORDS[square]
+        if side == WHITE:
+            low, high = number, (4 if first_move else number + 1)
+        else:
+            low, high = (5 if first_move else number - 1), number
+        for row in range(max(low, 1), min(high, 8) + 1):
+            end = square_index(row, letter)
+            if row != number and end not in occupant:
+                moves.append((end, None))
+            for other_letter in (letter - 1, letter + 1):
+                if 1 <= other_letter <= 8:
+                    other = occupant.get(square_index(row, other_letter))
+                    if other is not None and sides[other] != side:
+                        moves.append((square_index(row, other_letter), other))
+        return moves
+
+    rays = ROOK_RAYS[square] if kind == ROOK else BISHOP_RAYS[square] if kind == BISHOP else QUEEN_RAYS[square]
+    for ray in rays:
+        for end in ray:
+            other = occupant.get(end)
+            if other is None:
+                moves.append((end, None))
+            else:
+                if sides[other] != side:
+                    moves.append((end, other))
+                break
+    return moves
+
+
+def _capture_key(key, victim):
+    """returns the key of the table reached by capturing piece index victim, or None if that capture wins"""
+    code, need = key[victim]
+    if need == 1:
+        return None
+    return tuple((other_code, other_need - 1 if other_code == code and other_need else other_need)
+                 for place, (other_code, other_need) in enumerate(key) if place != victim)
+
+
+def _open(path):
+    """returns the table file at path memory-mapped, or None if there isn't one"""
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as file:
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _header(key):
+    """returns the file header for key: MAGIC, the piece count, then a code and need byte per piece"""
+    return MAGIC + bytes([len(key)]) + bytes(value for piece in key for value in piece)
+
+
+def solve(key, subtables):
+    """
+    solves the table for key and returns its data as a bytearray, one byte per position index: 0 for a draw (or a
+    position that can't happen), an odd n when the side to move wins in n plies, an even n when it loses in n plies.
+    subtables maps every key a capture can lead to onto its data (see generate())
+    """
+    size = table_size(key)
+    strides = _strides(key)
+    codes = [code for code, need in key]
+    sides = [code // 6 for code in codes]
+    kinds = [code % 6 for code in codes]
+    sub_strides = {}
+    for victim in range(len(key)):
+        sub_key = _capture_key(key, victim)
+        if sub_key is not None:
+            sub_strides[victim] = (subtables[sub_key], _strides(sub_key))
+
+    values = bytearray(size)
+    remaining = [0] * size  # moves still to be resolved, per position
+    longest = [0] * size  # the longest loss seen so far, for positions with no win yet
+    drawn = bytearray(size)  # 1 once a move is known to lead to a draw
+    winning = bytearray(size)  # 1 once a winning move has been queued
+    predecessors = {}  # position index -> positions with a quiet move into it
+    queues = [[] for distance in range(MAX_DISTANCE * 2 + 2)]  # distance -> positions resolved at that distance
+
+    for slots in itertools.product(*[range(count) for count in _slot_counts(key)]):
+        placed = [_slot_square(code, slot) for code, slot in zip(codes, slots)]
+        occupant = {}
+        for place, (square, first_move) in enumerate(placed):
+            occupant[square] = place
+        if len(occupant) != len(placed):
+            continue  # two pieces on one square
+        base = sum(slot * stride for slot, stride in zip(slots, strides))
+        for turn in (WHITE, BLACK):
+            position = base + turn
+            moves = 0
+            for place in range(len(placed)):
+                if sides[place] != turn:
+                    continue
+                square, first_move = placed[place]
+                stride = strides[place]
+                for end, victim in _targets(turn, kinds[place], square, first_move, occupant, sides):
+                    moves += 1
+                    if victim is None:
+                        child = position - turn + (1 - turn) + (end - slots[place]) * stride
+                        remaining[position] += 1
+                        predecessors.setdefault(child, []).append(position)
+                        continue
+                    if victim not in sub_strides:
+                        winning[position] = 1
+                        queues[1].append(position)  # this capture completes a set
+                        continue
+                    sub_values, sub_key_strides = sub_strides[victim]
+                    child = 1 - turn
+                    for other, stride_place in zip([p for p in range(len(placed)) if p != victim], sub_key_strides):
+                        child += (end if other == place else slots[other]) * stride_place
+                    result = sub_values[child]
+                    if result == 0:
+                        drawn[position] = 1
+                    elif result % 2:
+                        longest[position] = max(longest[position], result + 1)
+                    else:
+                        winning[position] = 1
+                        queues[result + 1].append(position)
+            if moves == 0:
+                drawn[position] = 1  # stuck: nobody can ever win from here
+            elif remaining[position] == 0 and not drawn[position] and not winning[position]:
+                queues[longest[position]].append(position)
+
+    for distance in range(1, len(queues)):
+        for position in queues[distance]:
+            if values[position]:
+                continue
+            if distance > MAX_DISTANCE:
+                raise ValueError('result too long to store: ' + table_name(key))
+            values[position] = distance
+            for parent in predecessors.get(position, ()):
+                if values[parent]:
+                    continue
+                if distance % 2 == 0:  # the side to move here loses, so moving here wins
+                    winning[parent] = 1
+                    queues[distance + 1].append(parent)
+                else:
+                    remaining[parent] -= 1
+                    longest[parent] = max(longest[parent], distance + 1)
+                    if remaining[parent] == 0 and not drawn[parent] and not winning[parent]:
+                        queues[longest[parent]].append(parent)
+    return values
+
+
+def generate(directory, key, log=None):
+    """
+    writes the table for key into directory, generating every table its captures lead to first. Tables that are
+    already there are left alone. Returns the path of the table file
+    """
+    path = os.path.join(directory, table_name(key))
+    if os.path.exists(path):
+        return path
+    subtables = {}
+    for victim in range(len(key)):
+        sub_key = _capture_key(key, victim)
+        if sub_key is not None and sub_key not in subtables:
+            with open(generate(directory, sub_key, log), 'rb') as file:
+                subtables[sub_key] = file.read()[len(_header(sub_key)):]
+    values = solve(key, subtables)
+    os.makedirs(directory, exist_ok=True)
+    with open(path + '.tmp', 'wb') as file:
+        file.write(_header(key))
+        file.write(values)
+    os.replace(path + '.tmp', path)
+    if log is not None:
+        log(table_name(key))
+    return path
+
+
+class Tablebase:
+    """
+    read-only access to the tables in a directory. Table files are memory-mapped the first time a position needs
+    them, and a missing table just means the position isn't covered
+    """
+
+    def __init__(self, directory, max_pieces=3):
+        self._directory = directory
+        self._max_pieces = max_pieces
+        self._tables = {}
+
+    def _table(self, key):
+        """returns the mapped data of the table for key and its header length, or None if it isn't there"""
+        if key not in self._tables:
+            data = _open(os.path.join(self._directory, table_name(key)))
+            if data is not None and data[:len(MAGIC)] != MAGIC:
+                raise ValueError('not a ChessVar tablebase file: ' + table_name(key))
+            self._tables[key] = data
+        return self._tables[key]
+
+    def probe(self, game):
+        """
+        returns the exact result of game for the side to move, or None if no table covers it: 0 for a draw, n when
+        the side to move wins in n plies, -n when it loses in n plies. Positions with register_piece() pieces on the
+        board aren't covered, since the tables only know how the standard pieces move
+        """
+        if game.get_piece_count() > self._max_pieces or game.get_game_state() != 'UNFINISHED':
+            return None
+        found = []
+        for square in range(64):
+            piece = game.get_position(square)
+            if piece is not None:
+                if type(piece) is not PIECE_CLASSES[piece.get_kind()]:
+                    return None
+                found.append((piece.get_side(), piece.get_kind(), square,
+                              piece.get_kind() == PAWN and piece.get_move()))
+        found.sort(key=lambda piece: (piece[0], -piece[1]))
+        tallies = (game.get_capture_tallies('White'), game.get_capture_tallies('Black'))
+        key = table_key([(side, kind) for side, kind, square, first_move in found], tallies)
+        data = self._table(key)
+        if data is None:
+            return None
+        index = 1 if game.get_turn() == 'Black' else 0
+        for (side, kind, square, first_move), stride in zip(found, _strides(key)):
+            slot = _square_slot(piece_code(side, kind), square, first_move)
+            if slot is None:
+                return None
+            index += slot * stride
+        result = data[len(MAGIC) + 1 + 2 * len(key) + index]
+        return result if result % 2 else -result
+
+    def best_move(self, game):
+        """
+        returns (move, result) for the best move in game according to the tables, where result is probe()'s answer
+        for the side to move, or None if the position (or one of the positions it leads to) isn't covered
+        """
+        if self.probe(game) is None:
+            return None
+        best = None
+        for move in game.legal_moves():
+            game.push_move(*move)
+            try:
+                if game.get_game_state() != 'UNFINISHED':
+                    result = 1
+                else:
+                    after = self.probe(game)
+                    if after is None:
+                        return None
+                    result = 0 if after == 0 else -after + (1 if after < 0 else -1)
+            finally:
+                game.pop_move()
+            if best is None or _preference(result) > _preference(best[1]):
+                best = (move, result)
+        return best
+
+
+def _preference(result):
+    """orders probe() results from the mover's point of view: quick wins, then longer wins, draws, then slow losses"""
+    if result > 0:
+        return MAX_DISTANCE * 2 - result
+    if result < 0:
+        return -MAX_DISTANCE * 2 - result
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate or probe ChessVar endgame tablebases.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('generate', help='solve tables and write them to a directory')
+    build.add_argument('materials', nargs='*', help="material like 'KRk', white uppercase and black lowercase")
+    build.add_argument('--all', type=int, metavar='PIECES', help='every material with up to this many pieces')
+    build.add_argument('--kinds', default=PIECE_LETTERS, help='piece letters to use with --all (default: PNBRQK)')
+    build.add_argument('--directory', default='tablebase')
+    probe = commands.add_parser('probe', help='print the result for a ChessVar.to_text() position')
+    probe.add_argument('directory')
+    probe.add_argument('position')
+    args = parser.parse_args(argv)
+
+    if args.command == 'generate':
+        materials = [parse_material(text) for text in args.materials]
+        if args.all:
+            letters = args.kinds.upper() + args.kinds.lower()
+            for count in range(1, args.all + 1):
+                for combination in itertools.combinations_with_replacement(letters, count):
+                    materials.append(parse_material(''.join(combination)))
+        for pieces in materials:
+            for key in material_keys(pieces):
+                generate(args.directory, key, lambda name: print(name, file=sys.stderr))
+    else:
+        game = ChessVar.from_text(args.position)
+        tablebase = Tablebase(args.directory, max_pieces=64)
+        best = tablebase.best_move(game)
+        print(json.dumps({'result': tablebase.probe(game),
+                          'move': (best[0][0] + best[0][1]).lower() if best is not None else None}))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,345 @@
+# Description: Regression tests for the ChessVar rules. The perft totals pin down move generation from the starting
+#              board, and seeded random games are replayed against ReferenceGame, a plain rewrite of the original
+#              rules (the recursive path checks and per-piece check_move() methods the tables replaced), comparing
+#              legal moves, game state and captures at every ply. The position hash is checked against a from-scratch
+#              recount through push_move()/pop_move() and fork(), and the attack maps against a scan of every piece.
+#              CompactGame is played alongside ChessVar on the same random moves, and saved positions have to load
+#              back to the same game. The rule tests run on BitBoard games as well, since the rules have to come out
+#              the same on either board.
+#
+#              python -m unittest test_ChessVar      (or python -m pytest -q)
+
+import copy
+import random
+import unittest
+
+from ChessVar import PAWN, ChessVar, CompactGame, SQUARE_NAMES
+
+
+START_PERFT = [20, 400, 8982]  # positions reached from the starting board after 1, 2 and 3 moves
+BACK_ROW = ('Rook', 'Knight', 'Bishop', 'Queen', 'King', 'Bishop', 'Knight', 'Rook')
+CAPTURES_TO_WIN = {'King': 1, 'Queen': 1, 'Rook': 2, 'Bishop': 2, 'Knight': 2, 'Pawn': 8}
+
+
+def square_name(number, letter):
+    """returns the 'A1' style name for a (row number, letter numeric) pair"""
+    return 'ABCDEFGH'[letter - 1] + str(number)
+
+
+def reaches(name, team, first_move, start, end, take, is_empty):
+    """
+    returns True if a piece of name and team can go from start to end, both (row number, letter numeric), by the
+    original rules: take says whether it would be capturing and is_empty(square) whether a square is open. Whose
+    pieces stand on start and end isn't looked at
+    """
+    row_step = end[0] - start[0]
+    letter_step = end[1] - start[1]
+    if name == 'Pawn':  # forward only, to row 4 (5 for black) on the first move, and captures one letter over
+        if team == 'White':
+            low, high = start[0], (4 if first_move else start[0] + 1)
+        else:
+            low, high = (5 if first_move else start[0] - 1), start[0]
+        if start == end or not low <= end[0] <= high:
+            return False
+        return abs(letter_step) == 1 if take else letter_step == 0
+    if name == 'Knight':
+        return sorted((abs(row_step), abs(letter_step))) == [1, 2]
+    if name == 'King':
+        return max(abs(row_step), abs(letter_step)) == 1
+    straight = row_step == 0 or letter_step == 0
+    diagonal = abs(row_step) == abs(letter_step)
+    if start == end or (name == 'Rook' and not straight) or (name == 'Bishop' and not diagonal) or \
+            not (straight or diagonal):
+        return False
+    distance = max(abs(row_step), abs(letter_step))
+    row_unit = (row_step > 0) - (row_step < 0)
+    letter_unit = (letter_step > 0) - (letter_step < 0)
+    return all(is_empty((start[0] + row_unit * step, start[1] + letter_unit * step)) for step in range(1, distance))
+
+
+def perft(game, depth):
+    """counts the positions reached by every legal move sequence of exactly depth moves"""
+    if depth == 0:
+        return 1
+    nodes = 0
+    for start_loc, end_loc in game.legal_moves():
+        game.push_move(start_loc, end_loc)
+        nodes += perft(game, depth - 1)
+        game.pop_move()
+    return nodes
+
+
+class ReferenceGame:
+    """
+    the original ChessVar rules written out the slow, obvious way, to check the table-driven rules against. The board
+    is a dictionary of (row number, letter numeric) -> [team, piece name, first_move]
+    """
+
+    def __init__(self):
+        self._board = {}
+        for letter in range(1, 9):
+            self._board[(1, letter)] = ['White', BACK_ROW[letter - 1], False]
+            self._board[(2, letter)] = ['White', 'Pawn', True]
+            self._board[(7, letter)] = ['Black', 'Pawn', True]
+            self._board[(8, letter)] = ['Black', BACK_ROW[letter - 1], False]
+        self._turn = 'White'
+        self._game_state = 'UNFINISHED'
+        self._captures = {'White': [], 'Black': []}
+
+    def get_game_state(self):
+        return self._game_state
+
+    def get_captures(self, team):
+        return self._captures[team]
+
+    def pieces(self):
+        """returns the (row number, letter numeric) squares holding the side to move's pieces"""
+        return [square for square, piece in self._board.items() if piece[0] == self._turn]
+
+    def is_legal(self, start, end):
+        """returns True if the piece on start may move to end, both (row number, letter numeric)"""
+        if self._game_state != 'UNFINISHED':
+            return False
+        piece = self._board.get(start)
+        target = self._board.get(end)
+        if piece is None or piece[0] != self._turn or (target is not None and target[0] == self._turn):
+            return False
+        team, name, first_move = piece
+        return reaches(name, team, first_move, start, end, target is not None, lambda square: square not in self._board)
+
+    def make_move(self, start, end):
+        """makes the move if it's legal and returns True, otherwise False"""
+        if not self.is_legal(start, end):
+            return False
+        target = self._board.get(end)
+        if target is not None:
+            captures = self._captures[self._turn]
+            captures.append(target[0][0] + target[1][0:2])
+            if captures.count(target[0][0] + target[1][0:2]) >= CAPTURES_TO_WIN[target[1]]:
+                self._game_state = self._turn.upper() + '_WON'
+        piece = self._board.pop(start)
+        piece[2] = False
+        self._board[end] = piece
+        self._turn = 'Black' if self._turn == 'White' else 'White'
+        return True
+
+    def legal_moves(self):
+        """returns the set of legal ('A2', 'A3') style moves for the side to move"""
+        return {(square_name(*start), square_name(number, letter))
+                for start in self.pieces() for number in range(1, 9) for letter in range(1, 9)
+                if self.is_legal(start, (number, letter))}
+
+
+def coordinates(name):
+    """returns the (row number, letter numeric) pair for an 'A1' style name"""
+    return int(name[1]), 'ABCDEFGH'.index(name[0].upper()) + 1
+
+
+def scan_attackers(game, target):
+    """returns the set of pieces in game that could capture on target (an 'A1' style name), found by trying them all"""
+    end = coordinates(target)
+    found = set()
+    for name in SQUARE_NAMES:
+        piece = game.get_position(name)
+        if piece is not None and reaches(piece.get_name(), piece.get_team(),
+                                         piece.get_name() == 'Pawn' and piece.get_move(), coordinates(name), end, True,
+                                         lambda square: game.get_position(square_name(*square)) is None):
+            found.add(piece)
+    return found
+
+
+class PerftTest(unittest.TestCase):
+
+    def test_start_position(self):
+        for bitboard in (False, True):
+            game = ChessVar(bitboard)
+            for depth, nodes in enumerate(START_PERFT, 1):
+                self.assertEqual(perft(game, depth), nodes)
+            self.assertEqual(game.to_text(), ChessVar().to_text())  # perft puts every move back
+
+
+class ReferenceTest(unittest.TestCase):
+
+    def test_random_games_match_reference(self):
+        generator = random.Random(2024)
+        for number in range(12):
+            game = ChessVar(bitboard=number % 2 == 1)
+            reference = ReferenceGame()
+            for ply in range(150):
+                legal = reference.legal_moves()
+                self.assertEqual(set(game.legal_moves()), legal)
+                for attempt in range(8):  # random pairs are almost all illegal, which exercises the rejections
+                    start_loc, end_loc = generator.choice(SQUARE_NAMES), generator.choice(SQUARE_NAMES)
+                    expected = (start_loc, end_loc) in legal
+                    self.assertEqual(game.is_legal(start_loc, end_loc), expected)
+                    self.assertEqual(game.rejection_reason(start_loc, end_loc) is None, expected)
+                if not legal:
+                    break
+                start_loc, end_loc = generator.choice(sorted(legal))
+                self.assertTrue(reference.make_move(coordinates(start_loc), coordinates(end_loc)))
+                self.assertTrue(game.make_move(start_loc.lower(), end_loc.lower()))
+                self.assertEqual(game.get_game_state(), reference.get_game_state())
+                self.assertEqual(game.get_white_captures(), reference.get_captures('White'))
+                self.assertEqual(game.get_black_captures(), reference.get_captures('Black'))
+
+
+class HashTest(unittest.TestCase):
+
+    def test_push_pop_and_fork_keep_the_hash(self):
+        generator = random.Random(7)
+        for number in range(20):
+            game = ChessVar(bitboard=number % 2 == 1)
+            hashes = [game.get_hash()]
+            while game.get_game_state() == 'UNFINISHED' and len(hashes) < 120:
+                game.push_move(*generator.choice(game.legal_moves()))
+                hashes.append(game.get_hash())
+                self.assertEqual(game.get_hash(), game._compute_hash())
+                if generator.random() < 0.2:  # take a few back and check we land on the same hashes
+                    for undo in range(generator.randint(1, min(4, len(hashes) - 1))):
+                        game.pop_move()
+                        hashes.pop()
+                        self.assertEqual(game.get_hash(), hashes[-1])
+                        self.assertEqual(game.get_hash(), game._compute_hash())
+                if generator.random() < 0.1 and game.get_game_state() == 'UNFINISHED':
+                    child = game.fork()
+                    before = game.to_text()
+                    for move in range(3):
+                        if child.get_game_state() != 'UNFINISHED':
+                            break
+                        child.push_move(*generator.choice(child.legal_moves()))
+                        self.assertEqual(child.get_hash(), child._compute_hash())
+                    self.assertEqual(game.to_text(), before)  # the fork's moves don't reach the original
+                    self.assertEqual(game.get_hash(), game._compute_hash())
+            while len(hashes) > 1:
+                game.pop_move()
+                hashes.pop()
+                self.assertEqual(game.get_hash(), hashes[-1])
+            self.assertEqual(game.to_text(), ChessVar().to_text())
+
+    def test_copy_and_rejected_moves_keep_forks_apart(self):
+        game = ChessVar()
+        game.make_move('d2', 'd4')
+        child = game.fork()
+        spare = copy.copy(child)  # counted as one more game sharing the board
+        del spare
+        self.assertFalse(child.make_move('e7', 'e4'))  # refused, so nothing gets copied
+        self.assertEqual(child.apply_moves('e7e4')['applied'], 0)
+        self.assertTrue(child.make_move('e7', 'e5'))
+        self.assertIsNone(game.get_position('E5'))
+        self.assertEqual(game.get_turn(), 'Black')
+        self.assertEqual(game.get_hash(), game._compute_hash())
+
+
+class AttackTest(unittest.TestCase):
+
+    def check_attacks(self, game):
+        for target in SQUARE_NAMES:
+            found = scan_attackers(game, target)
+            self.assertEqual(set(game.attackers_of(target)), found, target)
+            for team in ('White', 'Black'):
+                self.assertEqual(set(game.attackers_of(target, team)), {piece for piece in found
+                                                                        if piece.get_team() == team})
+                self.assertEqual(game.is_attacked(target, team), any(piece.get_team() == team for piece in found))
+
+    def test_attack_maps_match_a_full_scan(self):
+        generator = random.Random(22)
+        for number in range(6):
+            game = ChessVar(bitboard=number % 2 == 1)
+            self.check_attacks(game)
+            for ply in range(80):
+                if game.get_game_state() != 'UNFINISHED':
+                    break
+                game.push_move(*generator.choice(game.legal_moves()))
+                if generator.random() < 0.3:  # the incremental update has to work backwards too
+                    game.pop_move()
+                if generator.random() < 0.15:  # and in a fork, which starts out sharing the map
+                    child = game.fork()
+                    for move in range(2):
+                        if child.get_game_state() == 'UNFINISHED':
+                            child.push_move(*generator.choice(child.legal_moves()))
+                    self.check_attacks(child)
+                if ply % 4 == 0:
+                    self.check_attacks(game)
+            self.check_attacks(game)
+
+
+class SnapshotTest(unittest.TestCase):
+
+    def test_mid_game_round_trips(self):
+        generator = random.Random(13)
+        for number in range(10):
+            game = ChessVar()
+            for ply in range(generator.randint(5, 60)):
+                if game.get_game_state() != 'UNFINISHED':
+                    break
+                game.make_move(*generator.choice(game.legal_moves()))
+            text = game.to_text()
+            data = game.to_bytes()
+            pieces = [(square, piece.get_side(), piece.get_kind(), piece.get_kind() == PAWN and piece.get_move())
+                      for square, piece in ((square, game.get_position(square)) for square in range(64)) if piece]
+            tallies = [list(game.get_capture_tallies('White')), list(game.get_capture_tallies('Black'))]
+            loaded = (ChessVar.from_text(text), ChessVar.from_bytes(data), ChessVar.from_text(text, bitboard=True),
+                      ChessVar._load(pieces, game._which_turn, tallies, False))
+            for copy_game in loaded:
+                self.assertEqual(copy_game.get_hash(), game.get_hash())
+                self.assertEqual(copy_game.get_hash(), copy_game._compute_hash())
+                self.assertEqual(copy_game.to_text(), text)
+                self.assertEqual(copy_game.to_bytes(), data)
+                self.assertEqual(copy_game.get_game_state(), game.get_game_state())
+                self.assertEqual(copy_game.get_turn(), game.get_turn())
+                self.assertEqual(sorted(copy_game.legal_moves()), sorted(game.legal_moves()))
+
+    def test_bad_snapshots_raise_value_error(self):
+        start = ChessVar().to_text()
+        board, turn, unmoved, tallies = start.split()
+        bad_text = (
+            start.replace('rnbqkbnr', 'rnbqkbnrr', 1),  # a row of 9 spaces
+            start.replace('/8/', '/7x/', 1),  # not a piece letter
+            ' '.join((board, turn, unmoved + 'a1', tallies)),  # first move flag on a Rook
+            ' '.join((board, turn, 'a3', tallies)),  # and on an empty space
+            ' '.join((board, turn, unmoved, '900000/000000')),  # more Pawns taken than there are
+            ' '.join((board, turn, unmoved, '000000/000003')),  # a third Rook
+            ' '.join((board, turn, unmoved)),
+        )
+        for text in bad_text:
+            with self.assertRaises(ValueError, msg=text):
+                ChessVar.from_text(text)
+        data = ChessVar().to_bytes()
+        tally = bytearray(data)
+        tally[33] = 9  # white has taken 9 Pawns
+        for snapshot in (data[:-1], data + b'\0', bytes(tally), data[:32] + b'\2' + data[33:]):
+            with self.assertRaises(ValueError):
+                ChessVar.from_bytes(snapshot)
+        with self.assertRaises(ValueError):
+            ChessVar._load([], 0, [[0, 3, 0, 0, 0, 0], [0] * 6], False)
+
+
+class CompactTest(unittest.TestCase):
+
+    def test_random_moves_match_chessvar(self):
+        generator = random.Random(25)
+        for number in range(20):
+            game = ChessVar()
+            packed = CompactGame()
+            for ply in range(200):
+                over = game.get_game_state() != 'UNFINISHED'
+                moves = [(generator.choice(SQUARE_NAMES), generator.choice(SQUARE_NAMES)) for attempt in range(3)]
+                if not over:
+                    moves.append(generator.choice(game.legal_moves()))
+                for start_loc, end_loc in moves:  # mostly illegal pairs, then one legal move while there are any
+                    self.assertEqual(packed.make_move(start_loc, end_loc), game.make_move(start_loc, end_loc))
+                    self.assertEqual(packed.get_hash(), game.get_hash())
+                    self.assertEqual(packed.get_game_state(), game.get_game_state())
+                    self.assertEqual(packed.to_bytes(), game.to_bytes())
+                if ply % 10 == 0 or over:
+                    expanded = packed.expand()
+                    self.assertEqual(expanded.to_bytes(), game.to_bytes())
+                    self.assertEqual(expanded.get_hash(), game.get_hash())
+                    self.assertEqual(expanded.get_game_state(), game.get_game_state())
+                    self.assertEqual(expanded.compact().get_data(), packed.get_data())
+                if over:
+                    break  # after one round of moves on the finished game, which both have to refuse
+
+
+if __name__ == '__main__':
+    unittest.main()